@@ -1,6 +1,7 @@
 import pandas as pd
 import io
-import json
+import orjson
+import msgspec
 from kafka import KafkaProducer
 from kafka.errors import KafkaError
 from datetime import datetime
@@ -8,29 +9,71 @@ import time
 from pathlib import Path
 import os
 import sys
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple, Iterator, Optional
+from concurrent.futures import ProcessPoolExecutor
+import pyarrow.parquet as pq
 import uuid
+import threading
+
+# Columnas y tipos del dataset que realmente usa el productor
+DATASET_COLUMNS = [
+    'InvoiceNo', 'StockCode', 'Description', 'Quantity',
+    'InvoiceDate', 'UnitPrice', 'CustomerID', 'Country'
+]
+DATASET_DTYPES = {
+    'InvoiceNo': str,
+    'StockCode': str,
+    'Description': str,
+    'Country': str
+}
+# Filas por row group en la caché Parquet (unidad de lectura en streaming)
+DATASET_ROW_GROUP_SIZE = 10000
 
 class TransactionProducer:
-    def __init__(self, bootstrap_servers='kafka:9092', max_retries=5, retry_interval=5):
+    def __init__(self, bootstrap_servers='kafka:9092', max_retries=5, retry_interval=5, send_delay=0.0,
+                 value_format='json'):
         self.bootstrap_servers = bootstrap_servers
         self.max_retries = max_retries
         self.retry_interval = retry_interval
+        # Formato del payload: 'json' (compatible con el job de Flink) o 'msgpack'
+        self.value_format = value_format
+        self._serializer = self._build_serializer(value_format)
+        # Pausa opcional entre envíos para simular tráfico real (0 = sin pausa)
+        self.send_delay = send_delay
+        # Contador de envíos fallidos reportados por los callbacks de Kafka
+        self._send_failures = 0
+        self._failures_lock = threading.Lock()
         
         # Ya no necesitamos cargar esquema Avro
         self.producer = self._connect_with_retry()
         
+    @staticmethod
+    def _build_serializer(value_format: str):
+        """Devuelve el serializador de valores para el formato indicado"""
+        if value_format == 'msgpack':
+            return msgspec.msgpack.Encoder().encode
+        if value_format == 'json':
+            return orjson.dumps
+        raise ValueError(f"Unsupported value format: {value_format}")
+
     def _connect_with_retry(self) -> KafkaProducer:
         """Intenta conectar a Kafka con reintentos"""
         retries = 0
         while retries < self.max_retries:
             try:
                 print(f"Attempting to connect to Kafka (attempt {retries + 1}/{self.max_retries})...")
+                # linger_ms/batch_size agrupan mensajes en lotes más grandes:
+                # se añaden hasta 20 ms de latencia a cambio de mucho más throughput
+                # y menos peticiones al broker. acks=1 solo espera al líder.
                 producer = KafkaProducer(
                     bootstrap_servers=self.bootstrap_servers,
-                    value_serializer=lambda v: json.dumps(v).encode("utf-8"),
+                    value_serializer=self._serializer,
                     retries=5,
-                    acks='all'
+                    acks=1,
+                    linger_ms=20,
+                    batch_size=65536,
+                    compression_type='lz4',
+                    max_in_flight_requests_per_connection=5
                 )
                 print("Successfully connected to Kafka!")
                 return producer
@@ -46,17 +89,60 @@ class TransactionProducer:
 
     def serialize_avro(self, data: Dict[str, Any]) -> bytes:
         """Deprecated: kept to avoid attribute errors if referenced elsewhere."""
-        return json.dumps(data).encode("utf-8")
+        return orjson.dumps(data)
     
+    @staticmethod
+    def _add_timestamp_column(df: pd.DataFrame) -> pd.DataFrame:
+        """Parsea InvoiceDate una sola vez para todo el dataset y guarda el epoch en '_ts'"""
+        invoice_dates = pd.to_datetime(df['InvoiceDate'], errors='coerce')
+        # Las fechas inválidas (NaT) quedan como NaN al alinear por índice
+        df['_ts'] = invoice_dates.dropna().astype('datetime64[ns]').astype('int64') // 10**9
+        return df
+
+    def _prepare_dataframe(self, df: pd.DataFrame) -> Tuple[List[Dict[str, Any]], int]:
+        """Convierte un lote del DataFrame en transacciones usando operaciones columnares.
+
+        Requiere la columna '_ts' creada por _add_timestamp_column.
+        Devuelve las transacciones válidas y el número de filas descartadas.
+        """
+        quantity = pd.to_numeric(df['Quantity'], errors='coerce')
+        unit_price = pd.to_numeric(df['UnitPrice'], errors='coerce')
+
+        # Validar datos requeridos y que el precio no sea negativo
+        valid = (
+            df['CustomerID'].notna()
+            & df['InvoiceNo'].notna()
+            & df['_ts'].notna()
+            & quantity.notna()
+            & (unit_price >= 0)
+        )
+        rows = df[valid]
+        quantity = quantity[valid].astype('int64')
+        unit_price = unit_price[valid].astype('float64')
+
+        prepared = pd.DataFrame({
+            "invoice_no": rows['InvoiceNo'].astype(str),
+            "stock_code": rows['StockCode'].astype(str),
+            "description": rows['Description'].astype(str),
+            "quantity": quantity,
+            "invoice_date": rows['_ts'].astype('int64'),
+            "unit_price": unit_price,
+            "customer_id": rows['CustomerID'].astype(str),
+            "country": rows['Country'].astype(str),
+            "total_amount": quantity * unit_price
+        })
+        return prepared.to_dict(orient='records'), int((~valid).sum())
+
     def process_row(self, row: pd.Series) -> Dict[str, Any]:
         try:
             # Validar datos requeridos
             if pd.isna(row['CustomerID']) or pd.isna(row['InvoiceNo']):
                 raise ValueError("Missing required fields: CustomerID or InvoiceNo")
             
-            # Convertir timestamp a epoch
-            invoice_date = pd.to_datetime(row['InvoiceDate'])
-            timestamp = int(invoice_date.timestamp())
+            # Epoch precalculado por _add_timestamp_column
+            if pd.isna(row['_ts']):
+                raise ValueError("Invalid InvoiceDate")
+            timestamp = int(row['_ts'])
             
             # Calcular monto total
             quantity = int(row['Quantity'])
@@ -89,24 +175,92 @@ class TransactionProducer:
             return False
             
         try:
-            # Validar y completar datos faltantes
-            if not self.validate_transaction(transaction):
-                print(f"Error validating transaction: {transaction}")
-                return False
-                
+            # Las transacciones ya llegan validadas desde _prepare_dataframe
             # Enviar al tópico general de transacciones
             topic = 'ecommerce_transactions'
             
-            # Enviar mensaje con callback
+            # Enviar mensaje sin bloquear; los errores se reportan por callback
             future = self.producer.send(topic, transaction)
-            future.get(timeout=10)  # Esperar confirmación con timeout
+            future.add_errback(self._on_send_error, transaction.get('invoice_no'))
             return True
             
         except Exception as e:
             print(f"Error sending transaction {transaction.get('invoice_no')}: {str(e)}")
             return False
     
-    def process_dataset(self, excel_path: str, batch_size: int = 100) -> None:
+    def _on_send_error(self, invoice_no, exc) -> None:
+        with self._failures_lock:
+            self._send_failures += 1
+        print(f"Error sending transaction {invoice_no}: {str(exc)}")
+
+    def _ensure_parquet_cache(self, excel_path: str) -> Optional[Path]:
+        """Genera la caché Parquet si falta o es más antigua que el Excel.
+
+        Devuelve la ruta de la caché, o None si no se pudo escribir.
+        """
+        parquet_path = Path(excel_path).with_suffix('.parquet')
+
+        if parquet_path.exists() and parquet_path.stat().st_mtime >= os.path.getmtime(excel_path):
+            print(f"Using cached dataset: {parquet_path}")
+            return parquet_path
+
+        df = pd.read_excel(excel_path, usecols=DATASET_COLUMNS, dtype=DATASET_DTYPES)
+        try:
+            df.to_parquet(parquet_path, index=False, row_group_size=DATASET_ROW_GROUP_SIZE)
+            print(f"Cached dataset as Parquet: {parquet_path}")
+            return parquet_path
+        except Exception as e:
+            print(f"Warning: could not write Parquet cache: {str(e)}")
+            return None
+
+    def _iter_dataset(self, excel_path: str, batch_size: int) -> Iterator[pd.DataFrame]:
+        """Lee el dataset por lotes desde la caché Parquet sin cargarlo entero en memoria"""
+        parquet_path = self._ensure_parquet_cache(excel_path)
+
+        if parquet_path is None:
+            # Sin caché: cargar el Excel completo y recorrerlo por lotes
+            df = pd.read_excel(excel_path, usecols=DATASET_COLUMNS, dtype=DATASET_DTYPES)
+            for start in range(0, len(df), batch_size):
+                yield df.iloc[start:start + batch_size].copy()
+            return
+
+        parquet_file = pq.ParquetFile(parquet_path)
+        for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+            yield record_batch.to_pandas()
+
+    def _worker_config(self) -> Dict[str, Any]:
+        """Parámetros para crear un productor equivalente en otro proceso"""
+        return {
+            'bootstrap_servers': self.bootstrap_servers,
+            'max_retries': self.max_retries,
+            'retry_interval': self.retry_interval,
+            'send_delay': self.send_delay,
+            'value_format': self.value_format
+        }
+
+    def _process_batch(self, batch: pd.DataFrame) -> Tuple[int, int]:
+        """Envía un lote a Kafka y devuelve (procesadas, fallidas)"""
+        batch = self._add_timestamp_column(batch)
+        transactions, batch_failed = self._prepare_dataframe(batch)
+        batch_processed = 0
+        failures_before = self._send_failures
+
+        for transaction in transactions:
+            if self.send_transaction(transaction):
+                batch_processed += 1
+            else:
+                batch_failed += 1
+
+            # Simular velocidad real de transacciones (opcional)
+            if self.send_delay:
+                time.sleep(self.send_delay)
+
+        # Un único flush por lote; los callbacks ya han contado los errores
+        self.producer.flush()
+        send_failed = self._send_failures - failures_before
+        return batch_processed - send_failed, batch_failed + send_failed
+
+    def process_dataset(self, excel_path: str, batch_size: int = 100, workers: int = 1) -> None:
         print(f"Processing dataset from: {excel_path}")
         
         if not os.path.exists(excel_path):
@@ -114,39 +268,24 @@ class TransactionProducer:
             sys.exit(1)
             
         try:
-            # Leer todo el dataset y dividirlo manualmente en lotes
-            df = pd.read_excel(excel_path)
+            if workers > 1:
+                parquet_path = self._ensure_parquet_cache(excel_path)
+                if parquet_path is not None:
+                    self._process_parallel(parquet_path, batch_size, workers)
+                    return
+                print("Parquet cache unavailable, falling back to a single worker")
 
             total_processed = 0
             total_failed = 0
 
-            for start in range(0, len(df), batch_size):
-                end = start + batch_size
-                batch = df.iloc[start:end]
-
-                batch_processed = 0
-                batch_failed = 0
-
-                for _, row in batch.iterrows():
-                    try:
-                        transaction = self.process_row(row)
-                        if transaction and self.send_transaction(transaction):
-                            batch_processed += 1
-                        else:
-                            batch_failed += 1
-
-                        # Simular velocidad real de transacciones
-                        time.sleep(0.1)
-                    except Exception as e:
-                        print(f"Error processing row: {e}")
-                        batch_failed += 1
+            # Leer el dataset por lotes y enviarlos según se leen
+            for batch in self._iter_dataset(excel_path, batch_size):
+                batch_processed, batch_failed = self._process_batch(batch)
 
                 total_processed += batch_processed
                 total_failed += batch_failed
 
                 print(f"Processed batch: {batch_processed} successful, {batch_failed} failed")
-
-                self.producer.flush()
             
             print(f"\nProcessing complete!")
             print(f"Total transactions processed: {total_processed}")
@@ -156,8 +295,30 @@ class TransactionProducer:
             print(f"Error processing dataset: {str(e)}")
             sys.exit(1)
 
+    def _process_parallel(self, parquet_path: Path, batch_size: int, workers: int) -> None:
+        """Reparte los row groups de la caché entre procesos, cada uno con su propio KafkaProducer"""
+        num_row_groups = pq.ParquetFile(parquet_path).num_row_groups
+        workers = min(workers, num_row_groups)
+        config = self._worker_config()
+        tasks = [
+            (str(parquet_path), list(range(worker_id, num_row_groups, workers)), batch_size, config)
+            for worker_id in range(workers)
+        ]
+
+        print(f"Sending {num_row_groups} row groups with {workers} workers")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_send_row_groups, tasks))
+
+        print(f"\nProcessing complete!")
+        print(f"Total transactions processed: {sum(r[0] for r in results)}")
+        print(f"Total transactions failed: {sum(r[1] for r in results)}")
+
     def validate_transaction(self, transaction: Dict[str, Any]) -> bool:
-        """Validate transaction data and fill missing fields."""
+        """Validate transaction data and fill missing fields.
+
+        Not used on the send path: _prepare_dataframe already validates
+        whole batches before they reach send_transaction.
+        """
         if not transaction:
             return False
             
@@ -190,17 +351,43 @@ class TransactionProducer:
         
         return True
 
+def _send_row_groups(task: Tuple[str, List[int], int, Dict[str, Any]]) -> Tuple[int, int]:
+    """Worker de _process_parallel: envía a Kafka los row groups asignados"""
+    parquet_path, row_groups, batch_size, config = task
+    worker = TransactionProducer(**config)
+    parquet_file = pq.ParquetFile(parquet_path)
+
+    total_processed = 0
+    total_failed = 0
+    try:
+        for record_batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=row_groups):
+            batch_processed, batch_failed = worker._process_batch(record_batch.to_pandas())
+            total_processed += batch_processed
+            total_failed += batch_failed
+    finally:
+        worker.producer.close()
+
+    print(f"Worker finished row groups {row_groups}: {total_processed} successful, {total_failed} failed")
+    return total_processed, total_failed
+
 if __name__ == "__main__":
     # Configuración
     DATASET_PATH = os.getenv('DATASET_PATH', '/app/data/online_retail.xlsx')
     KAFKA_SERVERS = os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'kafka:9092')
+    SEND_DELAY = float(os.getenv('PRODUCER_SEND_DELAY', '0'))
+    VALUE_FORMAT = os.getenv('KAFKA_VALUE_FORMAT', 'json')
+    WORKERS = int(os.getenv('PRODUCER_WORKERS', '1'))
     
     print(f"Starting producer with config:")
     print(f"- Dataset path: {DATASET_PATH}")
     print(f"- Kafka servers: {KAFKA_SERVERS}")
+    print(f"- Send delay: {SEND_DELAY}s")
+    print(f"- Value format: {VALUE_FORMAT}")
+    print(f"- Workers: {WORKERS}")
     
     # Iniciar productor
-    producer = TransactionProducer(bootstrap_servers=KAFKA_SERVERS)
+    producer = TransactionProducer(bootstrap_servers=KAFKA_SERVERS, send_delay=SEND_DELAY,
+                                   value_format=VALUE_FORMAT)
     
     # Procesar dataset
-    producer.process_dataset(DATASET_PATH) 
\ No newline at end of file
+    producer.process_dataset(DATASET_PATH, workers=WORKERS) 
\ No newline at end of file
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Utilidades compartidas por los consumidores Kafka → Cassandra
+(kafka_to_cassandra.py y stream_processor.py)"""
+
+import os
+import uuid
+import logging
+import orjson
+import msgspec
+from kafka.structs import OffsetAndMetadata
+from cassandra.concurrent import execute_concurrent_with_args
+
+logger = logging.getLogger(__name__)
+
+# Formato del payload en Kafka: 'json' (por defecto) o 'msgpack'
+KAFKA_VALUE_FORMAT = os.getenv('KAFKA_VALUE_FORMAT', 'json')
+
+# Número máximo de INSERT en vuelo contra Cassandra por cada llamada a flush_inserts
+# (dimensionado para polls de hasta max_poll_records=5000 mensajes)
+CASSANDRA_CONCURRENCY = 100
+
+# Reintentos de un poll con INSERT fallidos antes de descartar esos registros
+# (se registran en el log) para que un registro defectuoso no bloquee el consumidor
+MAX_POLL_RETRIES = 5
+
+def build_value_deserializer():
+    """Devuelve el deserializador de valores según KAFKA_VALUE_FORMAT"""
+    if KAFKA_VALUE_FORMAT == 'msgpack':
+        return msgspec.msgpack.Decoder().decode
+    return orjson.loads
+
+def value_or_uuid(data, key):
+    """Devuelve data[key] como str; solo genera un UUID si falta el valor"""
+    value = data.get(key)
+    return str(value) if value else str(uuid.uuid4())
+
+def flush_inserts(session, statement, pending_inserts):
+    """Ejecutar concurrentemente los INSERT acumulados; devuelve las filas que fallaron"""
+    if not pending_inserts:
+        return []
+
+    results = execute_concurrent_with_args(
+        session,
+        statement,
+        pending_inserts,
+        concurrency=CASSANDRA_CONCURRENCY,
+        raise_on_first_error=False
+    )
+
+    failed = []
+    for values, (success, result) in zip(pending_inserts, results):
+        if not success:
+            failed.append(values)
+            logger.warning(f"⚠️ Cassandra insert failed for {values[0]}: {result}")
+    return failed
+
+def commit_offsets(consumer, positions):
+    """Commit explícito por partición del último offset procesado (+1)"""
+    if not positions:
+        return
+    try:
+        consumer.commit({
+            tp: OffsetAndMetadata(last + 1, None)
+            for tp, (first, last) in positions.items()
+        })
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to commit offsets: {e}")
+
+def rewind(consumer, positions):
+    """Volver cada partición al primer offset del poll para que Kafka lo reentregue"""
+    for tp, (first, last) in positions.items():
+        consumer.seek(tp, first)
@@ -1,15 +1,17 @@
 #!/usr/bin/env python3
 
-import json
 import time
 import logging
 from kafka import KafkaConsumer
 from cassandra.cluster import Cluster
 from redis import Redis
 from datetime import datetime
-import uuid
 import signal
 import sys
+from kafka_common import (
+    build_value_deserializer, value_or_uuid, flush_inserts,
+    commit_offsets, rewind, MAX_POLL_RETRIES
+)
 
 # Configurar logging
 logging.basicConfig(
@@ -24,7 +26,9 @@ class TransactionProcessor:
         self.consumer = None
         self.cassandra_session = None
         self.redis_client = None
+        self.insert_stmt = None
         self.processed_count = 0
+        self.poll_retries = 0
         
         # Configurar signal handler
         signal.signal(signal.SIGINT, self.signal_handler)
@@ -43,10 +47,13 @@ class TransactionProcessor:
                 'ecommerce_transactions',
                 bootstrap_servers=['kafka:9092'],
                 group_id='transaction-processor-v2',
-                value_deserializer=lambda m: json.loads(m.decode('utf-8')),
+                value_deserializer=build_value_deserializer(),
                 auto_offset_reset='latest',
-                enable_auto_commit=True,
-                consumer_timeout_ms=1000
+                enable_auto_commit=False,
+                consumer_timeout_ms=1000,
+                max_poll_records=5000,
+                fetch_min_bytes=1 << 16,
+                fetch_max_wait_ms=50
             )
             logger.info("✅ Connected to Kafka")
             
@@ -56,6 +63,15 @@ class TransactionProcessor:
             self.cassandra_session = cluster.connect('ecommerce_analytics')
             logger.info("✅ Connected to Cassandra")
             
+            # Preparar statement de Cassandra una sola vez
+            self.insert_stmt = self.cassandra_session.prepare("""
+                INSERT INTO transactions (
+                    invoice_no, stock_code, customer_id, country, total_amount, 
+                    quantity, created_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            """)
+            logger.info("✅ Prepared Cassandra statement")
+            
             # Conectar a Redis
             logger.info("🔌 Connecting to Redis...")
             self.redis_client = Redis(
@@ -74,55 +90,43 @@ class TransactionProcessor:
             logger.error(f"❌ Error connecting to services: {e}")
             return False
     
-    def process_transaction(self, transaction):
-        """Procesar una transacción"""
+    def process_transaction(self, transaction, pending_inserts, pipe, created_at, hour_str):
+        """Procesar una transacción; el INSERT se acumula en pending_inserts
+        y las métricas se encolan en el pipeline de Redis del poll.
+        created_at y hour_str se calculan una vez por poll."""
         try:
             # Extraer y validar datos
             country = transaction.get('country', 'UNKNOWN')
             total_amount = float(transaction.get('total_amount', 0))
-            customer_id = str(transaction.get('customer_id', uuid.uuid4()))
-            invoice_no = str(transaction.get('invoice_no', uuid.uuid4()))
+            customer_id = value_or_uuid(transaction, 'customer_id')
+            invoice_no = value_or_uuid(transaction, 'invoice_no')
+            stock_code = value_or_uuid(transaction, 'stock_code')
             quantity = int(transaction.get('quantity', 1))
             
             if total_amount <= 0:
                 return False
             
-            # Insertar en Cassandra
-            try:
-                insert_query = """
-                    INSERT INTO transactions (
-                        invoice_no, customer_id, country, total_amount, 
-                        quantity, created_at
-                    ) VALUES (?, ?, ?, ?, ?, ?)
-                """
-                
-                self.cassandra_session.execute(
-                    insert_query,
-                    (invoice_no, customer_id, country, total_amount, quantity, datetime.now().isoformat())
-                )
-            except Exception as e:
-                logger.warning(f"⚠️ Cassandra insert failed: {e}")
+            # Encolar inserción en Cassandra (se ejecuta al final del poll)
+            pending_inserts.append(
+                (invoice_no, stock_code, customer_id, country, total_amount, quantity, created_at)
+            )
             
-            # Actualizar métricas en Redis
-            try:
-                # Por país
-                country_key = f"analytics:{country}"
-                self.redis_client.hincrbyfloat(country_key, "revenue", total_amount)
-                self.redis_client.hincrby(country_key, "orders", 1)
-                self.redis_client.expire(country_key, 86400)
-                
-                # Global
-                self.redis_client.hincrbyfloat("analytics:global", "total_revenue", total_amount)
-                self.redis_client.hincrby("analytics:global", "total_orders", 1)
-                
-                # Por hora
-                hour_key = f"analytics:hourly:{datetime.now().strftime('%Y-%m-%d-%H')}"
-                self.redis_client.hincrbyfloat(hour_key, "revenue", total_amount)
-                self.redis_client.hincrby(hour_key, "orders", 1)
-                self.redis_client.expire(hour_key, 86400 * 7)  # 7 días
-                
-            except Exception as e:
-                logger.warning(f"⚠️ Redis update failed: {e}")
+            # Encolar métricas en Redis
+            # Por país
+            country_key = f"analytics:{country}"
+            pipe.hincrbyfloat(country_key, "revenue", total_amount)
+            pipe.hincrby(country_key, "orders", 1)
+            pipe.expire(country_key, 86400)
+            
+            # Global
+            pipe.hincrbyfloat("analytics:global", "total_revenue", total_amount)
+            pipe.hincrby("analytics:global", "total_orders", 1)
+            
+            # Por hora
+            hour_key = f"analytics:hourly:{hour_str}"
+            pipe.hincrbyfloat(hour_key, "revenue", total_amount)
+            pipe.hincrby(hour_key, "orders", 1)
+            pipe.expire(hour_key, 86400 * 7)  # 7 días
             
             return True
             
@@ -143,6 +147,7 @@ class TransactionProcessor:
         
         try:
             while self.running:
+                positions = {}
                 try:
                     # Obtener mensajes con timeout
                     message_batch = self.consumer.poll(timeout_ms=1000)
@@ -150,29 +155,75 @@ class TransactionProcessor:
                     if not message_batch:
                         continue
                     
-                    # Procesar mensajes del batch
+                    # Procesar mensajes del batch; positions guarda por partición
+                    # el primer y el último offset procesados en este poll
+                    pending_inserts = []
+                    pipe = self.redis_client.pipeline()
+                    
+                    # Marcas de tiempo comunes a todo el poll
+                    # (created_at se enlaza como datetime: la columna es timestamp)
+                    now = datetime.now()
+                    created_at = now
+                    hour_str = now.strftime('%Y-%m-%d-%H')
                     for topic_partition, messages in message_batch.items():
+                        if not self.running:
+                            break
                         for message in messages:
                             if not self.running:
                                 break
-                                
+                            
+                            first = positions.get(topic_partition, (message.offset,))[0]
+                            positions[topic_partition] = (first, message.offset)
                             transaction = message.value
                             
-                            if self.process_transaction(transaction):
+                            if self.process_transaction(
+                                transaction, pending_inserts, pipe, created_at, hour_str
+                            ):
                                 self.processed_count += 1
                                 
                                 # Log cada 5 transacciones
                                 if self.processed_count % 5 == 0:
                                     logger.info(f"📈 Processed {self.processed_count} transactions")
-                            
-                            # Pequeña pausa
-                            time.sleep(0.05)
                     
-                    # Commit manual
-                    self.consumer.commit()
+                    # Ejecutar los INSERT del poll de forma concurrente
+                    failed_inserts = flush_inserts(self.cassandra_session, self.insert_stmt, pending_inserts)
+                    if failed_inserts and self.poll_retries >= MAX_POLL_RETRIES:
+                        # Sin salida tras varios reintentos: descartar los registros fallidos
+                        for values in failed_inserts:
+                            logger.error(
+                                f"☠️ Dropping transaction after {MAX_POLL_RETRIES} retries: {values}"
+                            )
+                        failed_inserts = []
+                    batch_ok = not failed_inserts
+                    
+                    # Actualizar métricas de Redis en un único round-trip; si Cassandra
+                    # falló se omite para no contar dos veces al reprocesar el poll
+                    if batch_ok:
+                        try:
+                            pipe.execute()
+                        except Exception as e:
+                            batch_ok = False
+                            logger.warning(f"⚠️ Redis update failed: {e}")
+                    
+                    # Commit de los offsets procesados solo si Cassandra y Redis se
+                    # actualizaron; si no, rebobinar para que Kafka reentregue el poll
+                    # (los mensajes no procesados por una parada no se incluyen)
+                    if batch_ok:
+                        commit_offsets(self.consumer, positions)
+                        self.poll_retries = 0
+                    else:
+                        if failed_inserts:
+                            self.poll_retries += 1
+                        logger.warning("⚠️ Rewinding partitions after failed writes")
+                        rewind(self.consumer, positions)
+                        time.sleep(1)
                     
                 except Exception as e:
                     logger.error(f"❌ Error in processing loop: {e}")
+                    try:
+                        rewind(self.consumer, positions)
+                    except Exception as seek_error:
+                        logger.warning(f"⚠️ Failed to rewind partitions: {seek_error}")
                     time.sleep(1)
                     
         except KeyboardInterrupt:
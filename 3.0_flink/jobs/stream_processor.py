@@ -1,20 +1,24 @@
 #!/usr/bin/env python3
 
-import json
 import time
 import logging
 import sys
-import uuid
 import signal
 import threading
+import queue
 from datetime import datetime
+from dateutil import parser as date_parser
 from kafka import KafkaConsumer
 from cassandra.cluster import Cluster
 import redis
+from kafka_common import (
+    build_value_deserializer, value_or_uuid, flush_inserts,
+    commit_offsets, rewind, MAX_POLL_RETRIES
+)
 
 # Configurar logging
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler()
@@ -22,6 +26,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger('StreamProcessor')
 
+# Escritura en segundo plano: hilos para Cassandra, tamaño de cada bloque
+# de INSERT y capacidad máxima de la cola (en bloques)
+CASSANDRA_WRITER_THREADS = 4
+WRITE_CHUNK_SIZE = 500
+WRITE_QUEUE_SIZE = 64
+
 class ECommerceStreamProcessor:
     def __init__(self):
         self.running = True
@@ -30,6 +40,15 @@ class ECommerceStreamProcessor:
         self.redis_client = None
         self.processed_count = 0
         self.error_count = 0
+        self.poll_retries = 0
+        
+        # Colas acotadas hacia los hilos de escritura y contadores de fallos
+        self._cass_q = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._redis_q = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._writer_threads = []
+        self._failures_lock = threading.Lock()
+        self._failed_inserts = []
+        self._redis_failures = 0
         
         # Configurar signal handlers
         signal.signal(signal.SIGINT, self.signal_handler)
@@ -47,9 +66,12 @@ class ECommerceStreamProcessor:
                 'ecommerce_transactions',
                 bootstrap_servers=['kafka:9092'],
                 auto_offset_reset='earliest',
-                enable_auto_commit=True,
+                enable_auto_commit=False,
                 group_id='flink_stream_processor',
-                value_deserializer=lambda x: json.loads(x.decode('utf-8'))
+                value_deserializer=build_value_deserializer(),
+                max_poll_records=5000,
+                fetch_min_bytes=1 << 16,
+                fetch_max_wait_ms=50
             )
             logger.info("✅ Connected to Kafka")
             
@@ -81,52 +103,56 @@ class ECommerceStreamProcessor:
             logger.error(f"❌ Failed to connect to services: {e}")
             return False
     
-    def process_transaction(self, transaction_data):
-        """Procesar una transacción individual"""
+    def process_transaction(self, transaction_data, pending_inserts, pipe, current_time):
+        """Procesar una transacción individual.
+
+        El INSERT de Cassandra se acumula en pending_inserts y se ejecuta
+        concurrentemente al final del poll con flush_inserts(); las métricas
+        se encolan en el pipeline de Redis compartido por todo el poll.
+        current_time se calcula una vez por poll y se usa para created_at.
+        """
         try:
             # Extraer y validar datos
             country = str(transaction_data.get('country', 'UNKNOWN')).strip()
             total_amount = float(transaction_data.get('total_amount', 0))
-            customer_id = str(transaction_data.get('customer_id', str(uuid.uuid4())))
-            invoice_no = str(transaction_data.get('invoice_no', str(uuid.uuid4())))
-            stock_code = str(transaction_data.get('stock_code', str(uuid.uuid4())))
+            customer_id = value_or_uuid(transaction_data, 'customer_id')
+            invoice_no = value_or_uuid(transaction_data, 'invoice_no')
+            stock_code = value_or_uuid(transaction_data, 'stock_code')
             quantity = int(transaction_data.get('quantity', 1))
             description = str(transaction_data.get('description', 'Unknown Product'))
             
             # Usar la fecha original del invoice si está disponible
             original_date = transaction_data.get('invoice_date')
-            logger.debug(f"🔍 Raw invoice_date from Kafka: {original_date}, type: {type(original_date)}")
+            logger.debug("🔍 Raw invoice_date from Kafka: %s, type: %s", original_date, type(original_date))
             
             if original_date:
                 try:
                     # Si es un timestamp Unix (número)
                     if isinstance(original_date, (int, float)):
                         invoice_date = datetime.fromtimestamp(original_date)
-                        logger.debug(f"✅ Parsed Unix timestamp: {invoice_date}")
+                        logger.debug("✅ Parsed Unix timestamp: %s", invoice_date)
                     else:
-                        # Si es un string, usar dateutil parser
-                        from dateutil import parser
-                        invoice_date = parser.parse(str(original_date))
-                        logger.debug(f"✅ Parsed string date: {invoice_date}")
+                        # Si es un string ISO-8601 usar el parser nativo; dateutil solo como respaldo
+                        try:
+                            invoice_date = datetime.fromisoformat(str(original_date))
+                        except ValueError:
+                            invoice_date = date_parser.parse(str(original_date))
+                        logger.debug("✅ Parsed string date: %s", invoice_date)
                 except Exception as parse_error:
                     logger.warning(f"⚠️ Failed to parse invoice_date '{original_date}': {parse_error}")
-                    invoice_date = datetime.now()
+                    invoice_date = current_time
             else:
                 logger.debug("⚠️ No invoice_date found, using current time")
-                invoice_date = datetime.now()
-            
-            current_time = datetime.now()  # Solo para created_at
+                invoice_date = current_time
             
             # Validar que el monto sea válido
             if total_amount <= 0:
-                logger.debug(f"Skipping transaction with invalid amount: {total_amount}")
+                logger.debug("Skipping transaction with invalid amount: %s", total_amount)
                 return False
             
-            # 1. Insertar en Cassandra
+            # 1. Encolar inserción en Cassandra
             try:
                 unit_price = total_amount / quantity if quantity > 0 else 0
-                transaction_id = f"{invoice_no}_{customer_id}_{int(current_time.timestamp())}"
-                
                 # Preparar los valores usando la fecha original
                 values = (
                     invoice_no,
@@ -141,19 +167,16 @@ class ECommerceStreamProcessor:
                     current_time   # Solo created_at usa tiempo actual
                 )
                 
-                logger.debug(f"🔍 Inserting: {values}")
-                self.cassandra_session.execute(self.prepared_statement, values)
-                logger.debug(f"💾 Saved to Cassandra: {transaction_id}")
+                logger.debug("🔍 Queueing insert: %s", values)
+                pending_inserts.append(values)
                 
             except Exception as e:
                 logger.error(f"⚠️ Cassandra insert failed for {invoice_no}: {e}")
                 logger.error(f"   Data: {transaction_data}")
                 return False
             
-            # 2. Actualizar métricas en Redis usando fecha original
+            # 2. Encolar métricas en Redis usando fecha original
             try:
-                pipe = self.redis_client.pipeline()
-                
                 # Métricas por país
                 country_key = f"analytics:country:{country}"
                 pipe.hincrbyfloat(country_key, "revenue", total_amount)
@@ -170,8 +193,7 @@ class ECommerceStreamProcessor:
                 pipe.hincrby(hour_key, "orders", 1)
                 pipe.expire(hour_key, 172800)  # 48 horas
                 
-                pipe.execute()
-                logger.debug(f"📊 Updated Redis metrics for {country} on {invoice_date.date()}")
+                logger.debug("📊 Queued Redis metrics for %s on %s", country, invoice_date)
                 
             except Exception as e:
                 logger.warning(f"⚠️ Redis update failed: {e}")
@@ -183,6 +205,132 @@ class ECommerceStreamProcessor:
             logger.error(f"   Transaction data: {transaction_data}")
             return False
     
+    def start_writers(self):
+        """Arrancar los hilos que vacían las colas hacia Cassandra y Redis"""
+        for i in range(CASSANDRA_WRITER_THREADS):
+            thread = threading.Thread(
+                target=self._cassandra_writer, name=f"cassandra-writer-{i}", daemon=True
+            )
+            thread.start()
+            self._writer_threads.append(thread)
+        
+        thread = threading.Thread(target=self._redis_writer, name="redis-writer", daemon=True)
+        thread.start()
+        self._writer_threads.append(thread)
+    
+    def stop_writers(self):
+        """Enviar la señal de parada a los hilos de escritura y esperarlos"""
+        for _ in range(CASSANDRA_WRITER_THREADS):
+            self._cass_q.put(None)
+        self._redis_q.put(None)
+        for thread in self._writer_threads:
+            thread.join(timeout=10)
+        self._writer_threads = []
+    
+    def _cassandra_writer(self):
+        """Hilo de escritura: ejecuta bloques de INSERT encolados"""
+        while True:
+            chunk = self._cass_q.get()
+            try:
+                if chunk is None:
+                    return
+                try:
+                    failed = flush_inserts(self.cassandra_session, self.prepared_statement, chunk)
+                except Exception as e:
+                    logger.error(f"⚠️ Cassandra writer failed: {e}")
+                    failed = chunk
+                
+                # Registrar los fallos antes de task_done para que join() ya los vea
+                if failed:
+                    with self._failures_lock:
+                        self._failed_inserts.extend(failed)
+            finally:
+                self._cass_q.task_done()
+    
+    def _redis_writer(self):
+        """Hilo de escritura: ejecuta los pipelines de Redis encolados"""
+        while True:
+            pipe = self._redis_q.get()
+            try:
+                if pipe is None:
+                    return
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"⚠️ Redis update failed: {e}")
+                with self._failures_lock:
+                    self._redis_failures += 1
+            finally:
+                self._redis_q.task_done()
+    
+    def read_batch(self, message_batch, batch):
+        """Procesar los mensajes de un poll acumulando en batch los INSERT, el
+        pipeline de Redis y, por partición, el primer y el último offset procesados"""
+        current_time = datetime.now()  # created_at común a todo el poll
+        positions = batch['positions']
+        for topic_partition, messages in message_batch.items():
+            if not self.running:
+                break
+            for message in messages:
+                if not self.running:
+                    break
+                
+                first = positions.get(topic_partition, (message.offset,))[0]
+                positions[topic_partition] = (first, message.offset)
+                transaction = message.value
+                
+                if self.process_transaction(transaction, batch['inserts'], batch['pipe'], current_time):
+                    self.processed_count += 1
+                    batch['processed'] += 1
+                    
+                    # Log progreso cada 10 transacciones
+                    if self.processed_count % 10 == 0:
+                        logger.info(
+                            f"📈 Processed: {self.processed_count} transactions, "
+                            f"Errors: {self.error_count}"
+                        )
+                else:
+                    self.error_count += 1
+                    logger.error("❌ Failed to process transaction: %s", transaction)
+    
+    def submit_batch(self, batch):
+        """Delegar los INSERT de un poll, en bloques, a los hilos en segundo plano"""
+        inserts = batch['inserts']
+        for start in range(0, len(inserts), WRITE_CHUNK_SIZE):
+            self._cass_q.put(inserts[start:start + WRITE_CHUNK_SIZE])
+    
+    def finish_batch(self, batch):
+        """Esperar los INSERT del poll en vuelo y, solo si todos se aplicaron, enviar
+        sus métricas a Redis; devuelve True si Cassandra y Redis se actualizaron.
+
+        Los HINCRBY no son idempotentes: si el pipeline se aplicara junto a un
+        INSERT fallido, reprocesar el poll contaría dos veces sus métricas.
+        """
+        self._cass_q.join()
+        
+        with self._failures_lock:
+            failed_inserts, self._failed_inserts = self._failed_inserts, []
+        self.processed_count -= len(failed_inserts)
+        self.error_count += len(failed_inserts)
+        
+        if failed_inserts and self.poll_retries >= MAX_POLL_RETRIES:
+            # Sin salida tras varios reintentos: descartar los registros fallidos
+            for values in failed_inserts:
+                logger.error(f"☠️ Dropping transaction after {MAX_POLL_RETRIES} retries: {values}")
+            failed_inserts = []
+        
+        if failed_inserts:
+            self.poll_retries += 1
+            return False
+        
+        redis_failures_before = self._redis_failures
+        self._redis_q.put(batch['pipe'])
+        self._redis_q.join()
+        if self._redis_failures != redis_failures_before:
+            return False
+        
+        self.poll_retries = 0
+        return True
+    
     def start_processing(self):
         """Iniciar el procesamiento de transacciones"""
         logger.info("🚀 Starting E-commerce Stream Processor...")
@@ -194,60 +342,78 @@ class ECommerceStreamProcessor:
         logger.info("🔄 Starting message consumption from Kafka...")
         logger.info("📊 Processing transactions in real-time...")
         
+        self.start_writers()
+        
         try:
             # Loop principal de procesamiento
             consecutive_empty_polls = 0
             max_empty_polls = 10
             
+            # Poll cuyas escrituras siguen en los hilos de segundo plano: el
+            # siguiente poll se lee y procesa mientras estas terminan
+            in_flight = None
+            
             while self.running:
+                batch = None
                 try:
                     # Obtener mensajes de Kafka
                     message_batch = self.consumer.poll(timeout_ms=2000)
                     
-                    if not message_batch:
+                    if message_batch:
+                        consecutive_empty_polls = 0
+                        batch = {
+                            'inserts': [], 'pipe': self.redis_client.pipeline(),
+                            'positions': {}, 'processed': 0
+                        }
+                        self.read_batch(message_batch, batch)
+                    else:
                         consecutive_empty_polls += 1
                         if consecutive_empty_polls >= max_empty_polls:
                             logger.info("📭 No new messages for a while, continuing to poll...")
                             consecutive_empty_polls = 0
-                        continue
                     
-                    consecutive_empty_polls = 0
+                    # Cerrar el poll anterior: commit explícito de sus offsets solo si
+                    # Cassandra y Redis se actualizaron
+                    if in_flight is not None:
+                        done, in_flight = in_flight, None
+                        if self.finish_batch(done):
+                            commit_offsets(self.consumer, done['positions'])
+                        else:
+                            # Rebobinar al poll fallido y descartar el ya leído, que
+                            # Kafka volverá a entregar a continuación
+                            logger.warning("⚠️ Rewinding partitions after failed writes")
+                            positions = dict(batch['positions']) if batch else {}
+                            positions.update(done['positions'])
+                            rewind(self.consumer, positions)
+                            if batch:
+                                self.processed_count -= batch['processed']
+                            batch = None
                     
-                    # Procesar cada mensaje en el batch
-                    for topic_partition, messages in message_batch.items():
-                        for message in messages:
-                            if not self.running:
-                                break
-                                
-                            transaction = message.value
-                            logger.info(f"🔍 Processing message: {transaction}")
-                            
-                            if self.process_transaction(transaction):
-                                self.processed_count += 1
-                                logger.info(f"✅ Successfully processed transaction {self.processed_count}")
-                                
-                                # Log progreso cada 10 transacciones
-                                if self.processed_count % 10 == 0:
-                                    logger.info(
-                                        f"📈 Processed: {self.processed_count} transactions, "
-                                        f"Errors: {self.error_count}"
-                                    )
-                            else:
-                                self.error_count += 1
-                                logger.error(f"❌ Failed to process transaction: {transaction}")
-                            
-                            # Pequeña pausa para no saturar
-                            time.sleep(0.02)
-                    
-                    # Commit manual de offsets
-                    try:
-                        self.consumer.commit()
-                    except Exception as e:
-                        logger.warning(f"⚠️ Failed to commit offsets: {e}")
+                    if batch is not None:
+                        self.submit_batch(batch)
+                        in_flight, batch = batch, None
                         
                 except Exception as e:
                     logger.error(f"❌ Error in processing loop: {e}")
+                    # Sin commit: esperar lo que quede en vuelo y rebobinar todo lo pendiente
+                    try:
+                        self._cass_q.join()
+                        self._redis_q.join()
+                        positions = dict(batch['positions']) if batch else {}
+                        if in_flight is not None:
+                            positions.update(in_flight['positions'])
+                        in_flight = None
+                        rewind(self.consumer, positions)
+                    except Exception as seek_error:
+                        logger.warning(f"⚠️ Failed to rewind partitions: {seek_error}")
                     time.sleep(5)  # Pausa antes de reintentar
+            
+            # Parada: confirmar las escrituras del último poll antes de cerrar
+            if in_flight is not None:
+                if self.finish_batch(in_flight):
+                    commit_offsets(self.consumer, in_flight['positions'])
+                else:
+                    logger.warning("⚠️ Skipping offset commit after failed writes")
                     
         except KeyboardInterrupt:
             logger.info("⏹️ Keyboard interrupt received")
@@ -267,6 +433,10 @@ class ECommerceStreamProcessor:
         """Limpiar todos los recursos"""
         logger.info("🧹 Cleaning up resources...")
         
+        if self._writer_threads:
+            self.stop_writers()
+            logger.info("✅ Writer threads stopped")
+        
         if self.consumer:
             try:
                 self.consumer.close()
@@ -3,17 +3,44 @@
 from pyflink.datastream import StreamExecutionEnvironment
 from pyflink.common.serialization import DeserializationSchema, SimpleStringSchema
 from pyflink.datastream.connectors.kafka import KafkaSource, KafkaOffsetsInitializer
-from pyflink.common import WatermarkStrategy, Types
+from pyflink.common import WatermarkStrategy, Types, Row
 from pyflink.datastream.window import TumblingProcessingTimeWindows
 from pyflink.common.time import Time
-from pyflink.datastream.functions import ProcessWindowFunction, MapFunction, RuntimeContext, SinkFunction
-from cassandra.cluster import Cluster
-from redis import Redis
-import json, pytz, uuid
-from datetime import datetime
+from pyflink.datastream.functions import (
+    AggregateFunction, FlatMapFunction, ProcessWindowFunction, MapFunction, RuntimeContext, SinkFunction
+)
+from cassandra.cluster import Cluster, ExecutionProfile, EXEC_PROFILE_DEFAULT
+from cassandra.policies import (
+    TokenAwarePolicy, DCAwareRoundRobinPolicy, RetryPolicy, ConstantSpeculativeExecutionPolicy
+)
+from redis import Redis, ConnectionPool
+from datasketches import hll_sketch, hll_union, tgt_hll_type
+import orjson
+from datetime import datetime, timezone
 import io
+from array import array
+from collections import deque
 from pathlib import Path
 
+UTC = timezone.utc
+
+# Número máximo de INSERT asíncronos en vuelo
+MAX_IN_FLIGHT = 32
+
+# Script Lua que aplica en Redis los contadores de una ventana en un solo
+# comando (EVALSHA): pedidos, ingresos GBP/USD y TTL de 7 días
+REVENUE_LUA = """
+local k = KEYS[1]
+redis.call('HINCRBY', k, 'order_count', ARGV[1])
+redis.call('HINCRBYFLOAT', k, 'revenue_gbp', ARGV[2])
+redis.call('HINCRBYFLOAT', k, 'revenue_usd', ARGV[3])
+redis.call('EXPIRE', k, 604800)
+return 1
+"""
+
+# Datacenter local de Cassandra (CASSANDRA_DC en docker-compose)
+CASSANDRA_LOCAL_DC = 'datacenter1'
+
 # ------------------------------------------------------------------
 # Sink para Cassandra y Redis
 # ------------------------------------------------------------------
@@ -22,10 +49,26 @@ class CassandraRedisSink(MapFunction):
         self.cassandra_session = None
         self.redis_client = None
         self.insert_stmt = None
+        self._in_flight = deque()
+        self._pipe = None
+        self._revenue_script = None
         
     def open(self, runtime_context: RuntimeContext):
-        # Conectar a Cassandra
-        cluster = Cluster(['cassandra'])
+        # Conectar a Cassandra con enrutamiento token-aware: cada INSERT va
+        # directo a la réplica dueña de la partición (country, date_bucket)
+        write_profile = ExecutionProfile(
+            load_balancing_policy=TokenAwarePolicy(DCAwareRoundRobinPolicy(local_dc=CASSANDRA_LOCAL_DC)),
+            retry_policy=RetryPolicy(),
+            speculative_execution_policy=ConstantSpeculativeExecutionPolicy(delay=0.05, max_attempts=2),
+            request_timeout=2.0
+        )
+        cluster = Cluster(
+            contact_points=['cassandra'],
+            execution_profiles={EXEC_PROFILE_DEFAULT: write_profile},
+            protocol_version=4,
+            compression='lz4',
+            executor_threads=8
+        )
         self.cassandra_session = cluster.connect('ecommerce_analytics')
         
         # Preparar statement para Cassandra
@@ -33,104 +76,225 @@ class CassandraRedisSink(MapFunction):
             INSERT INTO revenue_by_country_time (
                 country, date_bucket, hour, timestamp, invoice_no,
                 customer_id, revenue_gbp, revenue_usd, order_count,
-                customer_count, avg_order_value, created_at, updated_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                customer_count, avg_order_value
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """)
+        # El INSERT es idempotente: permite la ejecución especulativa
+        self.insert_stmt.is_idempotent = True
         
-        # Conectar a Redis
-        self.redis_client = Redis(host='redis', port=6379, db=0)
+        # Conectar a Redis con un pool de conexiones persistentes
+        pool = ConnectionPool(
+            host='redis', port=6379, db=0, max_connections=32,
+            socket_keepalive=True, health_check_interval=30
+        )
+        self.redis_client = Redis(connection_pool=pool)
+        self._pipe = self.redis_client.pipeline(transaction=False)
+        self._revenue_script = self.redis_client.register_script(REVENUE_LUA)
         
     def close(self):
         if self.cassandra_session:
+            self._drain(0)
+            self._flush()
             self.cassandra_session.shutdown()
         if self.redis_client:
             self.redis_client.close()
             
+    def _drain(self, max_in_flight):
+        """Espera INSERT en vuelo hasta dejar como mucho max_in_flight pendientes"""
+        while len(self._in_flight) > max_in_flight:
+            future = self._in_flight.popleft()
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error inserting record: {str(e)}")
+
+    def _flush(self):
+        """Envía el pipeline de Redis acumulado"""
+        if len(self._pipe):
+            try:
+                self._pipe.execute()
+            except Exception as e:
+                print(f"Error updating Redis: {str(e)}")
+                self._pipe.reset()
+
     def map(self, value):
         try:
-            # Extraer datos del valor
+            # Extraer datos del valor (fecha y hora ya calculadas por la ventana)
             country = value['country']
-            timestamp = datetime.fromtimestamp(value['timestamp'])
-            date_bucket = timestamp.date()
-            hour = timestamp.hour
+            timestamp = value['timestamp']
+            date_bucket = value['date_bucket']
+            hour = value['hour']
             
-            # Insertar en Cassandra
-            self.cassandra_session.execute(
+            # Contadores de Redis en el pipeline compartido (se envía al final del registro)
+            redis_key = f"revenue:{country}:{date_bucket}:{hour}"
+            self._revenue_script(
+                keys=[redis_key],
+                args=[value['order_count'], float(value['revenue_gbp']), float(value['revenue_usd'])],
+                client=self._pipe
+            )
+            
+            # Insertar en Cassandra sin bloquear, acotando los INSERT en vuelo
+            self._in_flight.append(self.cassandra_session.execute_async(
                 self.insert_stmt,
                 (
                     country, date_bucket, hour, timestamp,
                     value['invoice_no'], value['customer_id'],
                     value['revenue_gbp'], value['revenue_usd'],
                     value['order_count'], value['customer_count'],
-                    value['avg_order_value'], timestamp, timestamp
+                    value['avg_order_value']
                 )
-            )
-            
-            # Actualizar contadores en Redis
-            redis_key = f"revenue:{country}:{date_bucket}:{hour}"
-            self.redis_client.hincrby(redis_key, "order_count", value['order_count'])
-            self.redis_client.hincrbyfloat(redis_key, "revenue_gbp", float(value['revenue_gbp']))
-            self.redis_client.hincrbyfloat(redis_key, "revenue_usd", float(value['revenue_usd']))
-            self.redis_client.expire(redis_key, 86400 * 7)  # TTL de 7 días
+            ))
+            self._drain(MAX_IN_FLIGHT - 1)
             
         except Exception as e:
             print(f"Error processing record: {str(e)}")
+        
+        # La ventana emite una ráfaga por país y luego nada durante 5 minutos:
+        # vaciar el pipeline en cada registro para no retrasar los contadores
+        # hasta la siguiente ventana (un solo round trip por registro)
+        self._flush()
             
         return value  # Devolver el valor para mantener el flujo de datos
 
 # ------------------------------------------------------------------
-# Procesador de ventana (1-min)
+# Parseo y validación en un único operador Python
+# ------------------------------------------------------------------
+TRANSACTION_ROW_TYPE = Types.ROW_NAMED(
+    ['country', 'total_amount', 'customer_id'],
+    [Types.STRING(), Types.DOUBLE(), Types.STRING()]
+)
+
+class ParseAndValidate(FlatMapFunction):
+    """Decodifica el JSON de Kafka y emite solo los campos que usa la ventana"""
+
+    def flat_map(self, value):
+        try:
+            elem = orjson.loads(value)
+            # JSON válido pero que no es un objeto ([], "x", 1...) se descarta
+            if not isinstance(elem, dict):
+                raise TypeError(f"expected object, got {type(elem).__name__}")
+            total_amount = float(elem.get('total_amount', 0))
+            customer_id = elem.get('customer_id')
+            country = str(elem.get('country') or 'UNKNOWN')
+        except (orjson.JSONDecodeError, ValueError, TypeError):
+            print(f"Invalid transaction: {value}")
+            return
+
+        yield Row(
+            country=country,
+            total_amount=total_amount,
+            customer_id=str(customer_id) if customer_id else None
+        )
+
+# ------------------------------------------------------------------
+# Conteo aproximado de clientes distintos
+# ------------------------------------------------------------------
+HLL_LG_K = 12
+
+class CustomerSketch:
+    """HyperLogLog de clientes distintos con memoria acotada por clave.
+
+    Envuelve hll_sketch para poder guardarlo como estado pickled de Flink.
+    """
+    __slots__ = ('sketch',)
+
+    def __init__(self, sketch=None):
+        self.sketch = sketch if sketch is not None else hll_sketch(HLL_LG_K, tgt_hll_type.HLL_4)
+
+    def update(self, customer_id):
+        self.sketch.update(customer_id)
+
+    def merge(self, other):
+        union = hll_union(HLL_LG_K)
+        union.update(self.sketch)
+        union.update(other.sketch)
+        return CustomerSketch(union.get_result(tgt_hll_type.HLL_4))
+
+    def estimate(self):
+        return int(round(self.sketch.get_estimate()))
+
+    def __getstate__(self):
+        return self.sketch.serialize_compact()
+
+    def __setstate__(self, state):
+        self.sketch = hll_sketch.deserialize(state)
+
+# ------------------------------------------------------------------
+# Pre-agregación incremental por país
+# ------------------------------------------------------------------
+class RevenueAgg(AggregateFunction):
+    """Acumula (ingresos, pedidos, clientes, cliente representativo) a medida
+    que llegan los elementos, de modo que la ventana solo guarda un
+    acumulador por clave. Ingresos y pedidos viven en arrays float32/int32
+    de un elemento que se actualizan en sitio; cada lectura de arr[0] sigue
+    creando un float/int de Python temporal, pero el acumulador serializado
+    ocupa 4 bytes por campo en lugar de un objeto Python."""
+
+    def create_accumulator(self):
+        # float32 tiene ~7 dígitos significativos: en ventanas con ingresos de
+        # cientos de miles de GBP se pierden los céntimos. Se acepta a cambio
+        # de un acumulador y una columna revenue_gbp (float) más compactos
+        return array('f', [0.0]), array('i', [0]), CustomerSketch(), None
+
+    def add(self, value, accumulator):
+        total_revenue_gbp, order_count, customers, representative = accumulator
+
+        # total_amount ya viene validado por ParseAndValidate
+        total_amount = value.total_amount
+        if total_amount >= 0:  # Solo considerar montos positivos
+            total_revenue_gbp[0] += total_amount
+            order_count[0] += 1
+
+        # Agregar customer_id si es válido
+        customer_id = value.customer_id
+        if customer_id and customer_id != 'UNKNOWN':
+            customers.update(customer_id)
+            representative = representative or customer_id
+
+        return total_revenue_gbp, order_count, customers, representative
+
+    def get_result(self, accumulator):
+        return accumulator
+
+    def merge(self, acc_a, acc_b):
+        acc_a[0][0] += acc_b[0][0]
+        acc_a[1][0] += acc_b[1][0]
+        return acc_a[0], acc_a[1], acc_a[2].merge(acc_b[2]), acc_a[3] or acc_b[3]
+
+# ------------------------------------------------------------------
+# Procesador de ventana: emite el resultado a partir del acumulador
 # ------------------------------------------------------------------
 class TransactionWindow(ProcessWindowFunction):
     def process(self, key, context, elements):
         try:
-            total_revenue_gbp = 0.0
-            order_count = 0
-            customer_ids = set()
-
-            for elem in elements:
-                # Validar y convertir el total_amount
-                try:
-                    total_amount = float(elem.get('total_amount', 0))
-                    if total_amount >= 0:  # Solo considerar montos positivos
-                        total_revenue_gbp += total_amount
-                        order_count += 1
-                except (ValueError, TypeError):
-                    print(f"Invalid total_amount in element: {elem}")
-                    continue
-
-                # Agregar customer_id si es válido
-                customer_id = elem.get('customer_id')
-                if customer_id and customer_id != 'UNKNOWN':
-                    customer_ids.add(customer_id)
+            # RevenueAgg entrega un único acumulador por ventana y clave
+            revenue_acc, count_acc, customers, representative = next(iter(elements))
+            # Convertir a tipos de Python solo al emitir el resultado
+            total_revenue_gbp, order_count = float(revenue_acc[0]), int(count_acc[0])
 
             # Solo procesar si hay datos válidos
             if order_count > 0:
                 window_start = context.window().start  # epoch ms
-                ts = datetime.fromtimestamp(window_start/1000, tz=pytz.UTC)
+                ts = datetime.fromtimestamp(window_start/1000, tz=UTC)
                 date_bucket = ts.date()
                 hour = ts.hour
 
-                # Generar un customer_id aleatorio si no hay ninguno válido
-                representative_customer_id = (
-                    list(customer_ids)[0] if customer_ids 
-                    else str(uuid.uuid4())
-                )
+                # Sin cliente válido en la ventana se marca como UNKNOWN
+                representative_customer_id = representative or 'UNKNOWN'
 
+                country = key or 'UNKNOWN'
                 result = {
-                    'country': key or 'UNKNOWN',
+                    'country': country,
                     'date_bucket': date_bucket,
                     'hour': hour,
                     'timestamp': ts,
-                    'invoice_no': str(uuid.uuid4()),
+                    'invoice_no': f"{country}:{window_start}",  # Determinista por ventana
                     'customer_id': representative_customer_id,
                     'revenue_gbp': total_revenue_gbp,
                     'revenue_usd': total_revenue_gbp * 1.27,
                     'order_count': order_count,
-                    'customer_count': len(customer_ids) or 1,  # Mínimo 1 cliente
-                    'avg_order_value': total_revenue_gbp / order_count,
-                    'created_at': ts,  # Usar la fecha del evento
-                    'updated_at': ts   # Usar la fecha del evento
+                    'customer_count': customers.estimate() or 1,  # Mínimo 1 cliente
+                    'avg_order_value': total_revenue_gbp / order_count
                 }
                 yield result
             else:
@@ -165,10 +329,15 @@ def main():
     
     # Procesar y agregar los datos
     stream \
-        .map(lambda x: json.loads(x), output_type=Types.STRING()) \
-        .key_by(lambda x: x['country']) \
+        .flat_map(ParseAndValidate(), output_type=TRANSACTION_ROW_TYPE) \
+        .key_by(lambda row: row.country, key_type=Types.STRING()) \
         .window(TumblingProcessingTimeWindows.of(Time.minutes(5))) \
-        .process(TransactionWindow()) \
+        .aggregate(
+            RevenueAgg(),
+            window_function=TransactionWindow(),
+            accumulator_type=Types.PICKLED_BYTE_ARRAY(),
+            output_type=Types.PICKLED_BYTE_ARRAY()
+        ) \
         .map(CassandraRedisSink())
     
     # Ejecutar el job
@@ -6,14 +6,21 @@ Dashboard de Inventarios para Sistema de RL
 import dash
 from dash import dcc, html, dash_table
 from dash.dependencies import Input, Output
-import plotly.graph_objs as go
 import plotly.express as px
 import pandas as pd
+import numpy as np
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
 from datetime import datetime, timedelta
 import os
 import logging
+import threading
+from operator import itemgetter
+import time
+from dash_extensions import EventSource
+from flask import Response
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -21,11 +28,200 @@ logger = logging.getLogger(__name__)
 
 # Configuración
 INVENTORY_API_URL = os.getenv('INVENTORY_API_URL', 'http://localhost:5001')
+# Timeout (conexión, lectura) en segundos para las llamadas al API
+API_TIMEOUT = (1, 5)
+# Segundos entre lecturas de métricas enviadas a los navegadores
+METRICS_PUSH_INTERVAL = 15
+
+# Sesión HTTP compartida: reutiliza conexiones keep-alive entre callbacks
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.1)
+)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
+# Campos de cada recomendación y su valor por defecto
+RECOMMENDATION_DEFAULTS = {
+    'action': 'N/A',
+    'current_stock': 0,
+    'order_quantity': 0,
+    'days_of_supply': 0,
+    'stockout_risk': 0,
+    'confidence': 0,
+    'priority': 'N/A'
+}
+
+# Color de fila según la acción recomendada y su estilo en la tabla
+ACTION_COLORS = {'reorder_high': 'red', 'reorder_medium': 'amber', 'no_reorder': 'green'}
+COLOR_STYLES = {'red': '#e74c3c', 'amber': '#f39c12', 'green': '#27ae60'}
+RECOMMENDATION_STYLES = [
+    {
+        'if': {'filter_query': f'{{_color}} = "{color}"'},
+        'backgroundColor': background,
+        'color': 'white'
+    }
+    for color, background in COLOR_STYLES.items()
+]
+
+def format_percent(values):
+    """Formatear una columna de fracciones como porcentajes ('12.3%')"""
+    return np.char.mod('%.1f%%', values.to_numpy(dtype=float) * 100)
+
+def build_recommendations_frame(recommendations):
+    """Construir la tabla de recomendaciones con operaciones por columna"""
+    df = pd.DataFrame.from_dict(recommendations, orient='index')
+    df = df.reindex(columns=list(RECOMMENDATION_DEFAULTS)).fillna(RECOMMENDATION_DEFAULTS)
+    
+    # Los valores ausentes convierten las columnas enteras a float: restaurarlas
+    for column in ('current_stock', 'order_quantity', 'days_of_supply'):
+        df[column] = pd.to_numeric(df[column], downcast='integer')
+    
+    return pd.DataFrame({
+        'Producto': df.index,
+        'Acción': df['action'].to_numpy(),
+        'Stock Actual': df['current_stock'].to_numpy(),
+        'Cantidad a Ordenar': df['order_quantity'].to_numpy(),
+        'Días de Suministro': df['days_of_supply'].to_numpy(),
+        'Riesgo de Desabasto': format_percent(df['stockout_risk']),
+        'Confianza': format_percent(df['confidence']),
+        'Prioridad': df['priority'].to_numpy(),
+        # Columna oculta con el color ya resuelto para el estilo condicional
+        '_color': df['action'].map(ACTION_COLORS).fillna('').to_numpy()
+    })
+
+# Figuras estáticas: se construyen una sola vez al importar el módulo
+def build_abc_distribution_figure():
+    """Construir gráfico de distribución ABC"""
+    # Datos simulados para demostración
+    data = {
+        'Clasificación': ['A', 'B', 'C'],
+        'Productos': [120, 350, 800],
+        'Valor': [65, 25, 10]
+    }
+    df = pd.DataFrame(data)
+    
+    fig = px.bar(df, x='Clasificación', y='Productos', 
+                color='Valor', 
+                title="Distribución de Productos por Clasificación ABC",
+                color_continuous_scale='RdYlBu')
+    
+    fig.update_layout(
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font=dict(color='#2c3e50')
+    )
+    
+    return fig
+
+# Datos simulados de días de suministro por producto
+_PRODUCTS = np.char.add('PROD', np.char.zfill(np.arange(1, 21).astype(str), 3))
+_DAYS = np.array([15, 8, 25, 12, 30, 5, 18, 22, 10, 35,
+                  7, 20, 28, 3, 16, 24, 9, 32, 14, 6])
+
+def build_days_supply_figure():
+    """Construir gráfico de días de suministro"""
+    fig = px.bar(x=_PRODUCTS, y=_DAYS,
+                title="Días de Suministro por Producto",
+                labels={'x': 'Producto', 'y': 'Días de Suministro'})
+    
+    fig.update_layout(
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font=dict(color='#2c3e50'),
+        xaxis_tickangle=-45
+    )
+    
+    # Agregar línea de referencia para 15 días
+    fig.add_hline(y=15, line_dash="dash", line_color="red", 
+                 annotation_text="Límite Óptimo (15 días)")
+    
+    return fig
+
+_ABC_FIG = build_abc_distribution_figure()
+_DAYS_FIG = build_days_supply_figure()
+
+# Campos de cada sección de métricas del modelo y sus valores por defecto
+_BM_FIELDS = ('service_level', 'stockout_rate', 'avg_inventory_turnover', 'holding_cost_ratio')
+_CO_FIELDS = ('estimated_savings', 'total_holding_cost', 'total_stockout_cost')
+_MP_FIELDS = ('learning_rate', 'epsilon', 'discount_factor', 'q_table_size')
+_BM_KEYS, _BM_DEFAULTS = itemgetter(*_BM_FIELDS), dict.fromkeys(_BM_FIELDS, 0)
+_CO_KEYS, _CO_DEFAULTS = itemgetter(*_CO_FIELDS), dict.fromkeys(_CO_FIELDS, 0)
+_MP_KEYS, _MP_DEFAULTS = itemgetter(*_MP_FIELDS), dict.fromkeys(_MP_FIELDS, 0)
+
+def extract_metric_section(metrics, section, keys, defaults):
+    """Extraer de una vez todos los campos de una sección, con sus valores por defecto"""
+    return keys({**defaults, **(metrics.get(section) or {})})
+
+def fetch_model_metrics():
+    """Obtener métricas del API de inventarios como (status_code, data)"""
+    response = SESSION.get(f"{INVENTORY_API_URL}/api/v1/inventory/metrics", timeout=API_TIMEOUT)
+    data = orjson.loads(response.content) if response.status_code == 200 else None
+    return response.status_code, data
+
+class MetricsBroadcaster:
+    """Consulta las métricas una vez por intervalo y las reparte a todos los
+    clientes conectados por Server-Sent Events (un hilo por proceso)."""
+    
+    def __init__(self, interval):
+        self.interval = interval
+        self._condition = threading.Condition()
+        self._payload = None
+        self._version = 0
+        self._thread = None
+    
+    def start(self):
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="metrics-poller", daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            try:
+                status_code, data = fetch_model_metrics()
+                payload = orjson.dumps({'status_code': status_code, 'data': data}).decode()
+            except Exception as e:
+                logger.error(f"Error getting model metrics: {e}")
+                payload = orjson.dumps({'status_code': None, 'error': str(e)}).decode()
+            
+            with self._condition:
+                self._payload = payload
+                self._version += 1
+                self._condition.notify_all()
+            time.sleep(self.interval)
+    
+    def stream(self):
+        """Generador SSE: emite cada nueva lectura y un keep-alive si no hay cambios"""
+        self.start()
+        version = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._version != version, timeout=self.interval)
+                payload, changed = self._payload, self._version != version
+                version = self._version
+            yield f"data: {payload}\n\n" if changed else ": keep-alive\n\n"
+
+METRICS_BROADCASTER = MetricsBroadcaster(METRICS_PUSH_INTERVAL)
 
 # Inicializar Dash
 app = dash.Dash(__name__, title="Dashboard de Inventarios RL")
 app.config.suppress_callback_exceptions = True
 
+# Servidor WSGI para gunicorn: gunicorn -k gevent inventory_dashboard:server
+server = app.server
+
+@server.route('/events/metrics')
+def metrics_events():
+    """Stream SSE con las métricas del modelo compartidas por todos los clientes"""
+    return Response(
+        METRICS_BROADCASTER.stream(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 # Layout principal
 app.layout = html.Div([
     # Header
@@ -100,13 +296,13 @@ app.layout = html.Div([
         # Gráfico de distribución de inventario
         html.Div([
             html.H3("Distribución de Inventario por Clasificación ABC"),
-            dcc.Graph(id="abc-distribution")
+            dcc.Graph(id="abc-distribution", figure=_ABC_FIG)
         ], style={'width': '50%', 'display': 'inline-block'}),
         
         # Gráfico de días de suministro
         html.Div([
             html.H3("Días de Suministro por Producto"),
-            dcc.Graph(id="days-supply")
+            dcc.Graph(id="days-supply", figure=_DAYS_FIG)
         ], style={'width': '50%', 'display': 'inline-block'})
     ]),
     
@@ -122,12 +318,8 @@ app.layout = html.Div([
         html.Div(id="model-metrics")
     ], style={'marginTop': '30px'}),
     
-    # Actualización automática
-    dcc.Interval(
-        id='interval-component',
-        interval=30*1000,  # 30 segundos
-        n_intervals=0
-    )
+    # Actualización automática: el servidor envía las métricas por SSE
+    EventSource(id='metrics-events', url='/events/metrics')
 ])
 
 # Estilos CSS
@@ -163,69 +355,6 @@ app.index_string = '''
 '''
 
 # Callbacks
-@app.callback(
-    Output('abc-distribution', 'figure'),
-    [Input('interval-component', 'n_intervals')]
-)
-def update_abc_distribution(n):
-    """Actualizar gráfico de distribución ABC"""
-    try:
-        # Datos simulados para demostración
-        data = {
-            'Clasificación': ['A', 'B', 'C'],
-            'Productos': [120, 350, 800],
-            'Valor': [65, 25, 10]
-        }
-        df = pd.DataFrame(data)
-        
-        fig = px.bar(df, x='Clasificación', y='Productos', 
-                    color='Valor', 
-                    title="Distribución de Productos por Clasificación ABC",
-                    color_continuous_scale='RdYlBu')
-        
-        fig.update_layout(
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            font=dict(color='#2c3e50')
-        )
-        
-        return fig
-    except Exception as e:
-        logger.error(f"Error updating ABC distribution: {e}")
-        return go.Figure()
-
-@app.callback(
-    Output('days-supply', 'figure'),
-    [Input('interval-component', 'n_intervals')]
-)
-def update_days_supply(n):
-    """Actualizar gráfico de días de suministro"""
-    try:
-        # Datos simulados
-        products = [f"PROD{i:03d}" for i in range(1, 21)]
-        days_supply = [15, 8, 25, 12, 30, 5, 18, 22, 10, 35, 
-                       7, 20, 28, 3, 16, 24, 9, 32, 14, 6]
-        
-        fig = px.bar(x=products, y=days_supply,
-                    title="Días de Suministro por Producto",
-                    labels={'x': 'Producto', 'y': 'Días de Suministro'})
-        
-        fig.update_layout(
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            font=dict(color='#2c3e50'),
-            xaxis_tickangle=-45
-        )
-        
-        # Agregar línea de referencia para 15 días
-        fig.add_hline(y=15, line_dash="dash", line_color="red", 
-                     annotation_text="Límite Óptimo (15 días)")
-        
-        return fig
-    except Exception as e:
-        logger.error(f"Error updating days supply: {e}")
-        return go.Figure()
-
 @app.callback(
     Output('recommendations-table', 'children'),
     [Input('get-recommendations', 'n_clicks'),
@@ -240,38 +369,26 @@ def update_recommendations(n_clicks, stock_codes):
         # Obtener recomendaciones del API
         stock_list = [code.strip() for code in stock_codes.split(',')]
         
-        response = requests.post(
+        response = SESSION.post(
             f"{INVENTORY_API_URL}/api/v1/inventory/recommendations",
-            json={"stock_codes": stock_list},
-            headers={"Content-Type": "application/json"}
+            data=orjson.dumps({"stock_codes": stock_list}),
+            headers={"Content-Type": "application/json"},
+            timeout=API_TIMEOUT
         )
         
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             recommendations = data.get('data', {}).get('recommendations', {})
             
             if not recommendations:
                 return html.P("No se encontraron recomendaciones")
             
             # Crear tabla
-            table_data = []
-            for stock_code, rec in recommendations.items():
-                table_data.append({
-                    'Producto': stock_code,
-                    'Acción': rec.get('action', 'N/A'),
-                    'Stock Actual': rec.get('current_stock', 0),
-                    'Cantidad a Ordenar': rec.get('order_quantity', 0),
-                    'Días de Suministro': rec.get('days_of_supply', 0),
-                    'Riesgo de Desabasto': f"{rec.get('stockout_risk', 0)*100:.1f}%",
-                    'Confianza': f"{rec.get('confidence', 0)*100:.1f}%",
-                    'Prioridad': rec.get('priority', 'N/A')
-                })
-            
-            df = pd.DataFrame(table_data)
+            df = build_recommendations_frame(recommendations)
             
             return dash_table.DataTable(
                 data=df.to_dict('records'),
-                columns=[{"name": i, "id": i} for i in df.columns],
+                columns=[{"name": i, "id": i} for i in df.columns if i != '_color'],
                 style_table={'overflowX': 'auto'},
                 style_cell={
                     'textAlign': 'left',
@@ -283,23 +400,7 @@ def update_recommendations(n_clicks, stock_codes):
                     'color': 'white',
                     'fontWeight': 'bold'
                 },
-                style_data_conditional=[
-                    {
-                        'if': {'filter_query': '{Acción} = "reorder_high"'},
-                        'backgroundColor': '#e74c3c',
-                        'color': 'white'
-                    },
-                    {
-                        'if': {'filter_query': '{Acción} = "reorder_medium"'},
-                        'backgroundColor': '#f39c12',
-                        'color': 'white'
-                    },
-                    {
-                        'if': {'filter_query': '{Acción} = "no_reorder"'},
-                        'backgroundColor': '#27ae60',
-                        'color': 'white'
-                    }
-                ]
+                style_data_conditional=RECOMMENDATION_STYLES
             )
         else:
             return html.P(f"Error al obtener recomendaciones: {response.status_code}")
@@ -310,43 +411,52 @@ def update_recommendations(n_clicks, stock_codes):
 
 @app.callback(
     Output('model-metrics', 'children'),
-    [Input('interval-component', 'n_intervals')]
+    [Input('metrics-events', 'message')]
 )
-def update_model_metrics(n):
-    """Actualizar métricas del modelo"""
+def update_model_metrics(message):
+    """Actualizar métricas del modelo con la última lectura recibida por SSE"""
+    if not message:
+        return html.P("Esperando métricas del modelo...")
+    
     try:
-        response = requests.get(f"{INVENTORY_API_URL}/api/v1/inventory/metrics")
+        event = orjson.loads(message)
+        status_code, data = event.get('status_code'), event.get('data')
         
-        if response.status_code == 200:
-            data = response.json()
-            metrics = data.get('data', {})
+        if event.get('error'):
+            return html.P(f"Error: {event['error']}")
+        
+        if status_code == 200:
+            metrics = data.get('data') or {}
+            sl, sr, it, hc = extract_metric_section(metrics, 'business_metrics', _BM_KEYS, _BM_DEFAULTS)
+            es, thc, tsc = extract_metric_section(metrics, 'cost_optimization', _CO_KEYS, _CO_DEFAULTS)
+            lr, eps, df, qts = extract_metric_section(metrics, 'model_performance', _MP_KEYS, _MP_DEFAULTS)
             
             return html.Div([
                 html.Div([
                     html.H4("Métricas de Negocio"),
-                    html.P(f"Nivel de Servicio: {metrics.get('business_metrics', {}).get('service_level', 0)*100:.1f}%"),
-                    html.P(f"Tasa de Desabasto: {metrics.get('business_metrics', {}).get('stockout_rate', 0)*100:.1f}%"),
-                    html.P(f"Rotación de Inventario: {metrics.get('business_metrics', {}).get('avg_inventory_turnover', 0):.1f}x"),
-                    html.P(f"Costo de Mantenimiento: {metrics.get('business_metrics', {}).get('holding_cost_ratio', 0)*100:.1f}%")
+                    html.P(f"Nivel de Servicio: {sl*100:.1f}%"),
+                    html.P(f"Tasa de Desabasto: {sr*100:.1f}%"),
+                    html.P(f"Rotación de Inventario: {it:.1f}x"),
+                    html.P(f"Costo de Mantenimiento: {hc*100:.1f}%")
                 ], style={'width': '50%', 'display': 'inline-block'}),
                 
                 html.Div([
                     html.H4("Optimización de Costos"),
-                    html.P(f"Ahorros Estimados: ${metrics.get('cost_optimization', {}).get('estimated_savings', 0):,.0f}"),
-                    html.P(f"Costo Total de Mantenimiento: ${metrics.get('cost_optimization', {}).get('total_holding_cost', 0):,.0f}"),
-                    html.P(f"Costo Total de Desabasto: ${metrics.get('cost_optimization', {}).get('total_stockout_cost', 0):,.0f}")
+                    html.P(f"Ahorros Estimados: ${es:,.0f}"),
+                    html.P(f"Costo Total de Mantenimiento: ${thc:,.0f}"),
+                    html.P(f"Costo Total de Desabasto: ${tsc:,.0f}")
                 ], style={'width': '50%', 'display': 'inline-block'}),
                 
                 html.Div([
                     html.H4("Parámetros del Modelo RL"),
-                    html.P(f"Learning Rate: {metrics.get('model_performance', {}).get('learning_rate', 0)}"),
-                    html.P(f"Epsilon: {metrics.get('model_performance', {}).get('epsilon', 0)}"),
-                    html.P(f"Discount Factor: {metrics.get('model_performance', {}).get('discount_factor', 0)}"),
-                    html.P(f"Tamaño Q-Table: {metrics.get('model_performance', {}).get('q_table_size', 0)}")
+                    html.P(f"Learning Rate: {lr}"),
+                    html.P(f"Epsilon: {eps}"),
+                    html.P(f"Discount Factor: {df}"),
+                    html.P(f"Tamaño Q-Table: {qts}")
                 ], style={'width': '100%', 'marginTop': '20px'})
             ])
         else:
-            return html.P(f"Error al obtener métricas: {response.status_code}")
+            return html.P(f"Error al obtener métricas: {status_code}")
             
     except Exception as e:
         logger.error(f"Error getting model metrics: {e}")
@@ -357,9 +467,14 @@ if __name__ == '__main__':
     logger.info(f"📊 Dashboard disponible en: http://localhost:8051")
     logger.info(f"🔗 API de Inventarios: {INVENTORY_API_URL}")
     
+    # Modo debug (recarga automática) solo en desarrollo con DEV=1
+    dev_mode = os.getenv('DEV') == '1'
+    if not dev_mode:
+        logger.info("💡 En producción usar: gunicorn -k gevent -w 2 -b 0.0.0.0:8051 inventory_dashboard:server")
+    
     app.run_server(
         host='0.0.0.0',
         port=8051,
-        debug=True
+        debug=dev_mode
     )
 
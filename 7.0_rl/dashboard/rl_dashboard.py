@@ -4,28 +4,118 @@ Dashboard de Dash para el componente de Reinforcement Learning
 """
 
 import dash
-from dash import dcc, html, Input, Output, callback
+from dash import dcc, html, Input, Output, State, callback, no_update
 import dash_bootstrap_components as dbc
 import plotly.graph_objs as go
 import plotly.express as px
 import pandas as pd
 import requests
-import json
-from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+import orjson
+import plotly.io as pio
+import hashlib
 import numpy as np
 import os
+import threading
+from pathlib import Path
+from flask_caching import Cache
+from numba import njit
+from plotly_resampler import FigureResampler
+from plotly_resampler.aggregation import LTTB
 
 # Configuración del API usando variables de entorno
 RL_API_HOST = os.getenv('RL_API_HOST', 'localhost')
 RL_API_PORT = os.getenv('RL_API_PORT', '5000')
 RL_API_URL = f"http://{RL_API_HOST}:{RL_API_PORT}/api/v1/rl"
 
+# Redis para la caché de respuestas del API
+REDIS_HOST = os.getenv('REDIS_HOST', 'redis')
+REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+
+# Segundos que se reutiliza una respuesta del API (algo menos que el intervalo de 30 s)
+API_CACHE_TIMEOUT = 25
+
+# Sesión HTTP compartida: reutiliza las conexiones keep-alive con el API
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=1))
+
+# Serializar las figuras devueltas por los callbacks con orjson
+pio.json.config.default_engine = 'orjson'
+
+# Figura vacía devuelta cuando falla un callback
+EMPTY_FIGURE = {'data': [], 'layout': {}}
+
+# Layouts estáticos de los gráficos, construidos una sola vez al importar.
+# hovermode unificado por eje x y sin búsqueda de spikes para que el hover
+# no degrade el renderizado cuando crecen las series
+_REWARDS_LAYOUT = {
+    'title': "Evolución de Recompensas por Episodio",
+    'xaxis': {'title': "Episodio"},
+    'yaxis': {'title': "Recompensa"},
+    'height': 400,
+    'hovermode': 'x unified',
+    'spikedistance': 0
+}
+_ACTIONS_LAYOUT = {
+    'title': "Distribución de Acciones del Agente",
+    'xaxis': {'title': "Tipo de Acción"},
+    'yaxis': {'title': "Frecuencia"},
+    'height': 400,
+    'hovermode': 'closest',
+    'spikedistance': 0
+}
+_METRICS_LAYOUT = {
+    'xaxis': {'title': "Fecha"},
+    'yaxis': {'title': "Valor"},
+    'height': 400,
+    'hovermode': 'x unified',
+    'spikedistance': 0
+}
+# Fechas fijas (2010-2011) de la evolución de métricas, de la más antigua a la más reciente
+_FIXED_DATES = np.arange(np.datetime64('2011-12-13'), np.datetime64('2011-12-19') + 1, dtype='datetime64[D]')
+
+# Métricas del selector y fechas de su serie en formato ISO para el dcc.Store
+METRIC_KEYS = ('conversion_rate', 'avg_reward', 'confidence_score', 'revenue_generated')
+_METRIC_DATES = np.datetime_as_string(_FIXED_DATES).tolist()
+
+_HISTORY_LAYOUT = {
+    'title': "Historial de Rendimiento de Recomendaciones",
+    'xaxis': {'title': "Fecha"},
+    'yaxis': {'title': "Tasa de Conversión", 'side': "left"},
+    'yaxis2': {'title': "Score de Confianza", 'side': "right", 'overlaying': "y"},
+    'height': 400,
+    'hovermode': 'x unified',
+    'spikedistance': 0
+}
+
+# Inicializar app Dash
+# Bootstrap se sirve localmente desde rl_assets/ (descargado al construir la imagen);
+# si no está disponible se usa el CDN
+ASSETS_FOLDER = Path(__file__).parent / 'rl_assets'
+BOOTSTRAP_STYLESHEETS = [] if (ASSETS_FOLDER / 'bootstrap.min.css').exists() else [dbc.themes.BOOTSTRAP]
+
+app = dash.Dash(
+    __name__,
+    assets_folder=str(ASSETS_FOLDER),
+    external_stylesheets=BOOTSTRAP_STYLESHEETS,
+    serve_locally=True
+)
+app.title = "RL E-commerce Dashboard"
+
+# Caché compartida entre callbacks y sesiones: una sola consulta al API por intervalo
+cache = Cache(app.server, config={
+    'CACHE_TYPE': os.getenv('DASHBOARD_CACHE_TYPE', 'RedisCache'),
+    'CACHE_REDIS_URL': f"redis://{REDIS_HOST}:{REDIS_PORT}/0",
+    'CACHE_KEY_PREFIX': 'rl_dashboard:'
+})
+
+@cache.memoize(timeout=API_CACHE_TIMEOUT)
 def get_api_data(endpoint):
-    """Obtener datos del API con manejo de errores"""
+    """Obtener datos del API con manejo de errores (las respuestas fallidas no se cachean)"""
     try:
-        response = requests.get(f"{RL_API_URL}/{endpoint}", timeout=5)
+        response = SESSION.get(f"{RL_API_URL}/{endpoint}", timeout=5)
         if response.status_code == 200:
-            return response.json()["data"]
+            return orjson.loads(response.content)["data"]
         else:
             print(f"Error API {endpoint}: {response.status_code}")
             return None
@@ -33,9 +123,27 @@ def get_api_data(endpoint):
         print(f"Error conectando al API {endpoint}: {e}")
         return None
 
-# Inicializar app Dash
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
-app.title = "RL E-commerce Dashboard"
+def payload_hash(*parts):
+    """Huella estable (igual en todos los procesos) de los datos que alimentan un gráfico"""
+    encoded = orjson.dumps(parts, option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY, default=str)
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+@njit(cache=True)
+def jitter_series(base, n, sigma):
+    """Serie de n valores base*(1 + N(0, sigma)), compilada con Numba (caché en disco)"""
+    out = np.empty(n)
+    for i in range(n):
+        out[i] = base * (1.0 + np.random.normal(0.0, sigma))
+    return out
+
+def post_api_data(endpoint, payload):
+    """Enviar una petición POST al API y devolver la respuesta"""
+    return SESSION.post(
+        f"{RL_API_URL}/{endpoint}",
+        data=orjson.dumps(payload),
+        headers={"Content-Type": "application/json"},
+        timeout=5
+    )
 
 # Layout principal
 app.layout = dbc.Container([
@@ -161,6 +269,14 @@ app.layout = dbc.Container([
         ], width=12)
     ]),
     
+    # Respuestas del API (estado del agente y métricas) compartidas por todos
+    # los gráficos, y huella de la última versión recibida por este navegador
+    dcc.Store(id="api-cache"),
+    dcc.Store(id="api-cache-hash"),
+    
+    # Series de todas las métricas del modelo para el selector
+    dcc.Store(id="metrics-store"),
+    
     # Intervalo de actualización
     dcc.Interval(
         id='interval-component',
@@ -169,79 +285,115 @@ app.layout = dbc.Container([
     )
 ], fluid=True)
 
+# El layout es estático: se reutiliza como layout de validación de callbacks
+app.validation_layout = app.layout
+
 # Callbacks
 @app.callback(
+    [Output("api-cache", "data"),
+     Output("api-cache-hash", "data")],
+    [Input("interval-component", "n_intervals")],
+    [State("api-cache-hash", "data")]
+)
+def update_api_cache(n, last_hash):
+    """Consultar el API una vez por intervalo para todos los gráficos y tarjetas"""
+    try:
+        # Una sola petición al API para el estado del agente y las métricas
+        blob = get_api_data("dashboard") or {}
+        data = {'agent': blob.get('agent'), 'metrics': blob.get('metrics')}
+        data_hash = payload_hash(data)
+        # Sin cambios: no reenviar los datos ni redibujar nada
+        if data_hash == last_hash:
+            return no_update, no_update
+        return data, data_hash
+    except Exception as e:
+        print(f"Error en update_api_cache: {e}")
+        return no_update, no_update
+
+# Tarjetas de métricas del agente formateadas en el cliente (sin ida y vuelta al servidor)
+app.clientside_callback(
+    """
+    function(cache) {
+        var d = cache && cache.agent;
+        if (!d) { return ['N/A', 'N/A', 'N/A', 'N/A']; }
+        var fixed = function(v) { return typeof v === 'number' ? v.toFixed(3) : 'N/A'; };
+        var episode = d.current_episode ? String(d.current_episode) : null;
+        return [
+            d.q_table_size != null ? String(d.q_table_size) : 'N/A',
+            fixed(d.epsilon),
+            fixed(d.learning_rate),
+            episode ? (episode.length > 8 ? episode.slice(0, 8) + '...' : episode) : 'N/A'
+        ];
+    }
+    """,
     [Output("q-table-size", "children"),
      Output("epsilon", "children"),
      Output("learning-rate", "children"),
      Output("current-episode", "children")],
-    [Input("interval-component", "n_intervals")]
+    [Input("api-cache", "data")]
 )
-def update_agent_metrics(n):
-    """Actualizar métricas del agente en tiempo real"""
-    try:
-        data = get_api_data("agent/state")
-        if data:
-            return [
-                str(data.get("q_table_size", "N/A")),
-                str(data.get("epsilon", "N/A")),
-                str(data.get("learning_rate", "N/A")),
-                str(data.get("current_episode", "N/A"))
-            ]
-        else:
-            return ["N/A", "N/A", "N/A", "N/A"]
-    except Exception as e:
-        print(f"Error en update_agent_metrics: {e}")
-        return ["N/A", "N/A", "N/A", "N/A"]
+
+# Figura de recompensas con remuestreo LTTB: al navegador solo llegan los puntos
+# visibles con el zoom actual. La figura es única por proceso (todas las sesiones ven
+# la misma serie del API), así que reconstruirla y remuestrearla con el zoom comparten
+# _REWARDS_LOCK; por eso no se usa register_update_graph_callback, que no toma el lock
+_REWARDS_FIG = FigureResampler(go.Figure(), default_n_shown_samples=2000, default_downsampler=LTTB())
+_REWARDS_LOCK = threading.Lock()
+
+@app.callback(
+    Output("rewards-chart", "figure", allow_duplicate=True),
+    [Input("rewards-chart", "relayoutData")],
+    prevent_initial_call=True
+)
+def resample_rewards_chart(relayout_data):
+    """Remuestrear el gráfico de recompensas para el rango de zoom actual"""
+    with _REWARDS_LOCK:
+        return _REWARDS_FIG.construct_update_data_patch(relayout_data)
 
 @app.callback(
     Output("rewards-chart", "figure"),
-    [Input("interval-component", "n_intervals")]
+    [Input("api-cache", "data")],
+    prevent_initial_call=True
 )
-def update_rewards_chart(n):
+def update_rewards_chart(api_data):
     """Actualizar gráfico de recompensas con datos reales"""
     try:
-        # Obtener datos reales del API
-        data = get_api_data("metrics")
+        # Datos reales del API (compartidos en api-cache)
+        data = (api_data or {}).get("metrics")
         if data and "episodes" in data and "rewards" in data:
             episodes = data["episodes"]
             rewards = data["rewards"]
         else:
             # Fallback a datos simulados si el API no responde
             episodes = list(range(1, 21))
-            rewards = [np.random.normal(0.5, 0.2) for _ in episodes]
+            rewards = np.random.normal(0.5, 0.2, size=len(episodes))
         
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=episodes,
-            y=rewards,
-            mode='lines+markers',
-            name='Recompensa',
-            line=dict(color='blue', width=2),
-            marker=dict(size=6)
-        ))
-        
-        fig.update_layout(
-            title="Evolución de Recompensas por Episodio",
-            xaxis_title="Episodio",
-            yaxis_title="Recompensa",
-            height=400
-        )
-        
-        return fig
+        with _REWARDS_LOCK:
+            _REWARDS_FIG.replace({'layout': _REWARDS_LAYOUT})
+            _REWARDS_FIG.add_trace({
+                'type': 'scattergl',
+                'mode': 'lines+markers',
+                'name': 'Recompensa',
+                'line': {'color': 'blue', 'width': 2},
+                'marker': {'size': 6}
+            }, hf_x=episodes, hf_y=rewards)
+            
+            # Copia de la vista remuestreada actual
+            return _REWARDS_FIG.to_dict()
     except Exception as e:
         print(f"Error en update_rewards_chart: {e}")
-        return go.Figure()
+        return EMPTY_FIGURE
 
 @app.callback(
     Output("actions-chart", "figure"),
-    [Input("interval-component", "n_intervals")]
+    [Input("api-cache", "data")],
+    prevent_initial_call=True
 )
-def update_actions_chart(n):
+def update_actions_chart(api_data):
     """Actualizar gráfico de distribución de acciones con datos reales"""
     try:
-        # Obtener datos reales del API
-        data = get_api_data("metrics")
+        # Datos reales del API (compartidos en api-cache)
+        data = (api_data or {}).get("metrics")
         if data and "action_distribution" in data:
             action_distribution = data["action_distribution"]
             actions = list(action_distribution.keys())
@@ -249,74 +401,79 @@ def update_actions_chart(n):
         else:
             # Fallback a datos simulados
             actions = ['low_price', 'medium_price', 'high_price', 'popular', 'personalized']
-            counts = [np.random.randint(10, 50) for _ in actions]
-        
-        fig = go.Figure(data=[
-            go.Bar(x=actions, y=counts, marker_color='lightblue')
-        ])
-        
-        fig.update_layout(
-            title="Distribución de Acciones del Agente",
-            xaxis_title="Tipo de Acción",
-            yaxis_title="Frecuencia",
-            height=400
-        )
+            counts = np.random.randint(10, 50, size=len(actions))
         
-        return fig
+        return {
+            'data': [{'type': 'bar', 'x': actions, 'y': counts, 'marker': {'color': 'lightblue'}}],
+            'layout': _ACTIONS_LAYOUT
+        }
     except Exception as e:
         print(f"Error en update_actions_chart: {e}")
-        return go.Figure()
+        return EMPTY_FIGURE
 
 @app.callback(
-    Output("metrics-chart", "figure"),
-    [Input("metric-selector", "value"),
-     Input("interval-component", "n_intervals")]
+    Output("metrics-store", "data"),
+    [Input("api-cache", "data")],
+    prevent_initial_call=True
 )
-def update_metrics_chart(metric, n):
-    """Actualizar gráfico de métricas con fechas reales"""
+def update_metrics_store(api_data):
+    """Calcular las series de todas las métricas; la selección se hace en el navegador"""
     try:
-        # Usar fechas reales de 2010-2011 en lugar de fechas actuales
-        base_date = datetime(2011, 12, 19)
-        dates = [base_date - timedelta(days=i) for i in range(7)]
-        dates.reverse()  # Ordenar de más antiguo a más reciente
-        
-        # Obtener datos reales del API si está disponible
-        data = get_api_data("metrics")
+        # Datos reales del API si están disponibles (compartidos en api-cache)
+        data = (api_data or {}).get("metrics")
+        n_dates = len(_METRIC_DATES)
         if data and "real_metrics" in data:
             # Usar datos reales de revenue para calcular métricas
             total_revenue = data["real_metrics"]["total_revenue"]
             conversion_rate = min(0.95, data["real_metrics"]["total_transactions"] / max(1, total_revenue / 25))
-            values = [conversion_rate * (1 + np.random.normal(0, 0.1)) for _ in dates]
+            series = {
+                metric: jitter_series(conversion_rate, n_dates, 0.1)
+                for metric in METRIC_KEYS
+            }
         else:
             # Fallback a datos simulados basados en 2010-2011
-            values = [np.random.uniform(0.3, 0.8) for _ in dates]
-        
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=dates,
-            y=values,
-            mode='lines+markers',
-            name=metric.replace('_', ' ').title(),
-            line=dict(color='green', width=2),
-            marker=dict(size=6)
-        ))
+            series = {metric: np.random.uniform(0.3, 0.8, size=n_dates) for metric in METRIC_KEYS}
         
-        fig.update_layout(
-            title=f"Evolución de {metric.replace('_', ' ').title()}",
-            xaxis_title="Fecha",
-            yaxis_title="Valor",
-            height=400
-        )
-        
-        return fig
+        return {
+            'dates': _METRIC_DATES,
+            'layout': _METRICS_LAYOUT,
+            **{metric: values.tolist() for metric, values in series.items()}
+        }
     except Exception as e:
-        print(f"Error en update_metrics_chart: {e}")
-        return go.Figure()
+        print(f"Error en update_metrics_store: {e}")
+        return no_update
+
+# Selección de métrica y título resueltos en el cliente: cambiar el desplegable
+# no genera una petición al servidor
+app.clientside_callback(
+    """
+    function(metric, store) {
+        if (!store || !store[metric]) { return {data: [], layout: {}}; }
+        var name = metric.replace(/_/g, ' ').replace(/\\b\\w/g, function(c) { return c.toUpperCase(); });
+        return {
+            data: [{
+                type: 'scattergl',
+                x: store.dates,
+                y: store[metric],
+                mode: 'lines+markers',
+                name: name,
+                line: {color: 'green', width: 2},
+                marker: {size: 6}
+            }],
+            layout: Object.assign({}, store.layout, {title: 'Evolución de ' + name})
+        };
+    }
+    """,
+    Output("metrics-chart", "figure"),
+    [Input("metric-selector", "value"),
+     Input("metrics-store", "data")]
+)
 
 @app.callback(
     Output("recommendations-output", "children"),
     [Input("generate-btn", "n_clicks")],
-    [Input("customer-id-input", "value")]
+    [State("customer-id-input", "value")],
+    prevent_initial_call=True
 )
 def generate_recommendations(n_clicks, customer_id):
     """Generar recomendaciones para un cliente"""
@@ -324,11 +481,10 @@ def generate_recommendations(n_clicks, customer_id):
         return ""
     
     try:
-        response = requests.post(f"{RL_API_URL}/recommendations", 
-                               json={"customer_id": customer_id})
+        response = post_api_data("recommendations", {"customer_id": customer_id})
         
         if response.status_code == 200:
-            data = response.json()["data"]
+            data = orjson.loads(response.content)["data"]
             
             return dbc.Alert([
                 html.H5("✅ Recomendaciones Generadas"),
@@ -346,18 +502,17 @@ def generate_recommendations(n_clicks, customer_id):
 
 @app.callback(
     Output("recommendations-history", "figure"),
-    [Input("interval-component", "n_intervals")]
+    [Input("api-cache", "data")],
+    prevent_initial_call=True
 )
-def update_recommendations_history(n):
+def update_recommendations_history(api_data):
     """Actualizar historial de recomendaciones con fechas reales"""
     try:
-        # Usar fechas reales de 2010-2011 en lugar de fechas actuales
-        base_date = datetime(2011, 12, 19)
-        dates = [base_date - timedelta(days=i) for i in range(7)]
-        dates.reverse()  # Ordenar de más antiguo a más reciente
+        # Fechas reales de 2010-2011, calculadas una vez al importar
+        dates = _FIXED_DATES
         
-        # Obtener datos reales del API si está disponible
-        data = get_api_data("metrics")
+        # Datos reales del API si están disponibles (compartidos en api-cache)
+        data = (api_data or {}).get("metrics")
         if data and "real_metrics" in data:
             # Usar datos reales para calcular métricas
             total_revenue = data["real_metrics"]["total_revenue"]
@@ -366,43 +521,37 @@ def update_recommendations_history(n):
             base_conversion_rate = min(0.4, total_transactions / max(1, total_revenue / 25))
             base_confidence = min(0.9, len(data["real_metrics"]["countries_data"]) / 30)
             
-            conversion_rates = [base_conversion_rate * (1 + np.random.normal(0, 0.1)) for _ in dates]
-            confidence_scores = [base_confidence * (1 + np.random.normal(0, 0.05)) for _ in dates]
+            conversion_rates = jitter_series(base_conversion_rate, len(dates), 0.1)
+            confidence_scores = jitter_series(base_confidence, len(dates), 0.05)
         else:
             # Fallback a datos simulados basados en 2010-2011
-            conversion_rates = [np.random.uniform(0.1, 0.4) for _ in dates]
-            confidence_scores = [np.random.uniform(0.6, 0.9) for _ in dates]
-        
-        fig = go.Figure()
-        
-        fig.add_trace(go.Scatter(
-            x=dates,
-            y=conversion_rates,
-            mode='lines+markers',
-            name='Tasa de Conversión',
-            yaxis='y'
-        ))
-        
-        fig.add_trace(go.Scatter(
-            x=dates,
-            y=confidence_scores,
-            mode='lines+markers',
-            name='Score de Confianza',
-            yaxis='y2'
-        ))
-        
-        fig.update_layout(
-            title="Historial de Rendimiento de Recomendaciones",
-            xaxis_title="Fecha",
-            yaxis=dict(title="Tasa de Conversión", side="left"),
-            yaxis2=dict(title="Score de Confianza", side="right", overlaying="y"),
-            height=400
-        )
+            conversion_rates = np.random.uniform(0.1, 0.4, size=len(dates))
+            confidence_scores = np.random.uniform(0.6, 0.9, size=len(dates))
         
-        return fig
+        return {
+            'data': [
+                {
+                    'type': 'scattergl',
+                    'x': dates,
+                    'y': conversion_rates,
+                    'mode': 'lines+markers',
+                    'name': 'Tasa de Conversión',
+                    'yaxis': 'y'
+                },
+                {
+                    'type': 'scattergl',
+                    'x': dates,
+                    'y': confidence_scores,
+                    'mode': 'lines+markers',
+                    'name': 'Score de Confianza',
+                    'yaxis': 'y2'
+                }
+            ],
+            'layout': _HISTORY_LAYOUT
+        }
     except Exception as e:
         print(f"Error en update_recommendations_history: {e}")
-        return go.Figure()
+        return EMPTY_FIGURE
 
 if __name__ == '__main__':
     app.run_server(debug=True, host='0.0.0.0', port=8050) 
\ No newline at end of file
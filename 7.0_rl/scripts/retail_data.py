@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Lectura del dataset Online Retail compartida por los generadores de inventario
+"""
+
+import os
+import logging
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+def read_retail_data(excel_path, parquet_path, columns=None, engine=None):
+    """Leer el dataset de retail desde la caché Parquet, regenerándola si el Excel es más reciente.
+
+    columns limita las columnas leídas (None = todas) y engine elige el motor de read_excel."""
+    if (os.path.exists(parquet_path) and
+            os.path.getmtime(parquet_path) >= os.path.getmtime(excel_path)):
+        logger.info(f"⚡ Usando caché Parquet: {parquet_path}")
+        return pd.read_parquet(parquet_path, columns=columns)
+    
+    df = pd.read_excel(excel_path, usecols=columns, engine=engine)
+    
+    # Columnas de texto con tipos mezclados (p.ej. StockCode 85123A/22423) a string para Parquet
+    for col in df.select_dtypes(include='object').columns:
+        df[col] = df[col].astype('string')
+    
+    try:
+        df.to_parquet(parquet_path, compression='snappy')
+        logger.info(f"💾 Caché Parquet creada: {parquet_path}")
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo escribir la caché Parquet: {e}")
+    
+    return df
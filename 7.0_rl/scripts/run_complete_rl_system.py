@@ -4,9 +4,10 @@ Script completo para ejecutar todo el sistema RL de inventarios
 """
 import sys
 import os
-import time
 import logging
 import json
+import atexit
+import asyncio
 import subprocess
 from datetime import datetime
 
@@ -16,19 +17,30 @@ sys.path.append('/opt/rl/src')
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Sesión de Cassandra compartida por todos los pasos (se crea en el primer uso)
+_CLUSTER = None
+_SESSION = None
+
+def get_session():
+    """Obtener la sesión compartida de Cassandra, conectando una sola vez"""
+    global _CLUSTER, _SESSION
+    if _SESSION is None:
+        from cassandra.cluster import Cluster
+        _CLUSTER = Cluster(['cassandra'], protocol_version=4, compression='lz4')
+        _SESSION = _CLUSTER.connect('ecommerce_analytics')
+        atexit.register(_CLUSTER.shutdown)
+    return _SESSION
+
 def test_cassandra_connection():
     """Verificar conexión a Cassandra"""
     try:
-        from cassandra.cluster import Cluster
-        cluster = Cluster(['cassandra'])
-        session = cluster.connect('ecommerce_analytics')
+        session = get_session()
         
         # Test query
         result = session.execute("SELECT COUNT(*) FROM inventory_current")
         count = result.one()[0]
         
         logger.info(f"✅ Cassandra conectado - {count} productos en inventario")
-        cluster.shutdown()
         return True
         
     except Exception as e:
@@ -42,7 +54,7 @@ def run_rl_training():
         
         from inventory_rl_runner import InventoryRLRunner
         
-        runner = InventoryRLRunner()
+        runner = InventoryRLRunner(session=get_session())
         episode_rewards = runner.run_simulation(episodes=20, days_per_episode=15)
         
         # Calcular estadísticas
@@ -68,7 +80,7 @@ def generate_recommendations():
         
         from inventory_rl_runner import InventoryRLRunner
         
-        runner = InventoryRLRunner()
+        runner = InventoryRLRunner(session=get_session())
         recommendations = runner.generate_recommendations()
         runner.save_recommendations_to_db(recommendations)
         
@@ -87,21 +99,22 @@ def generate_recommendations():
         logger.error(f"❌ Error generando recomendaciones: {e}")
         return []
 
-def start_api_server():
+async def start_api_server():
     """Iniciar servidor API"""
     try:
         logger.info("🌐 Iniciando servidor API...")
         
         # Ejecutar API en background
-        api_process = subprocess.Popen([
-            'python3', '/opt/rl/src/inventory_api_extended.py'
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        api_process = await asyncio.create_subprocess_exec(
+            'python3', '/opt/rl/src/inventory_api_extended.py',
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
         
         # Esperar un poco para que inicie
-        time.sleep(3)
+        await asyncio.sleep(3)
         
         # Verificar que esté corriendo
-        if api_process.poll() is None:
+        if api_process.returncode is None:
             logger.info("✅ Servidor API iniciado en puerto 5002")
             return api_process
         else:
@@ -112,35 +125,49 @@ def start_api_server():
         logger.error(f"❌ Error iniciando API: {e}")
         return None
 
-def test_api_endpoints():
+async def probe_endpoint(http, url, timeout):
+    """Consultar un endpoint del API y devolver su código de estado y su JSON"""
+    async with http.get(url, timeout=timeout) as response:
+        data = await response.json(content_type=None) if response.status == 200 else None
+        return response.status, data
+
+async def probe_api_endpoints(base_url):
+    """Consultar en paralelo los endpoints del API con una única sesión HTTP"""
+    import aiohttp
+    
+    async with aiohttp.ClientSession() as http:
+        return await asyncio.gather(
+            probe_endpoint(http, f"{base_url}/health", aiohttp.ClientTimeout(total=5)),
+            probe_endpoint(http, f"{base_url}/api/inventory/status", aiohttp.ClientTimeout(total=10)),
+            probe_endpoint(http, f"{base_url}/api/inventory/recommendations", aiohttp.ClientTimeout(total=10))
+        )
+
+async def test_api_endpoints():
     """Probar endpoints del API"""
     try:
-        import requests
-        
         base_url = "http://localhost:5002"
         
+        (health_status, _), (status_code, status_data), (recs_code, recs_data) = await probe_api_endpoints(
+            base_url
+        )
+        
         # Test health check
-        response = requests.get(f"{base_url}/health", timeout=5)
-        if response.status_code == 200:
+        if health_status == 200:
             logger.info("✅ Health check OK")
         else:
-            logger.warning(f"⚠️ Health check failed: {response.status_code}")
+            logger.warning(f"⚠️ Health check failed: {health_status}")
         
         # Test inventory status
-        response = requests.get(f"{base_url}/api/inventory/status", timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            logger.info(f"✅ Inventory status OK - {len(data['data'])} productos")
+        if status_code == 200:
+            logger.info(f"✅ Inventory status OK - {len(status_data['data'])} productos")
         else:
-            logger.warning(f"⚠️ Inventory status failed: {response.status_code}")
+            logger.warning(f"⚠️ Inventory status failed: {status_code}")
         
         # Test recommendations
-        response = requests.get(f"{base_url}/api/inventory/recommendations", timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            logger.info(f"✅ Recommendations OK - {len(data['data'])} recomendaciones")
+        if recs_code == 200:
+            logger.info(f"✅ Recommendations OK - {len(recs_data['data'])} recomendaciones")
         else:
-            logger.warning(f"⚠️ Recommendations failed: {response.status_code}")
+            logger.warning(f"⚠️ Recommendations failed: {recs_code}")
         
         return True
         
@@ -148,13 +175,67 @@ def test_api_endpoints():
         logger.error(f"❌ Error probando API: {e}")
         return False
 
+# Consultas antiguas (ALLOW FILTERING) con las que se reconcilian los contadores diarios;
+# cada una recibe el día y la medianoche de ese día
+LEGACY_DAILY_COUNTS = {
+    'recommendations': (
+        "SELECT COUNT(*) FROM inventory_recommendations WHERE recommendation_date = %s ALLOW FILTERING",
+        lambda day, midnight: [day]
+    ),
+    'inventory_events': (
+        "SELECT COUNT(*) FROM inventory_events WHERE event_timestamp >= %s ALLOW FILTERING",
+        lambda day, midnight: [midnight]
+    ),
+}
+
+# Fila marcador en daily_counters que indica que el día ya se reconcilió
+BACKFILL_MARKER = 'backfill_done'
+
+def get_daily_count(session, metric, day):
+    """Leer un contador diario (una partición); 0 si aún no hay fila"""
+    row = session.execute(
+        "SELECT value FROM daily_counters WHERE metric = %s AND day = %s", [metric, day]
+    ).one()
+    return row.value if row is not None else 0
+
+def backfill_daily_counters(session):
+    """Migración: reconciliar una vez por día los contadores con las consultas antiguas.
+
+    Se ejecuta antes de que los pasos RL empiecen a incrementar contadores; suma a cada
+    contador la diferencia con el conteo real y registra la fila marcador al terminar.
+    """
+    from inventory_rl_runner import ensure_daily_counters_table
+    
+    ensure_daily_counters_table(session)
+    today = datetime.now().date()
+    if get_daily_count(session, BACKFILL_MARKER, today):
+        return
+    
+    midnight = datetime.combine(today, datetime.min.time())
+    for metric, (legacy_query, legacy_params) in LEGACY_DAILY_COUNTS.items():
+        try:
+            count = session.execute(legacy_query, legacy_params(today, midnight)).one()[0]
+        except Exception as e:
+            # La tabla puede no existir todavía (p.ej. sin recomendaciones guardadas)
+            logger.warning(f"⚠️ No se pudo contar {metric} con la consulta antigua: {e}")
+            count = 0
+        missing = count - get_daily_count(session, metric, today)
+        if missing > 0:
+            session.execute(
+                "UPDATE daily_counters SET value = value + %s WHERE metric = %s AND day = %s",
+                [missing, metric, today]
+            )
+    
+    session.execute(
+        "UPDATE daily_counters SET value = value + 1 WHERE metric = %s AND day = %s",
+        [BACKFILL_MARKER, today]
+    )
+    logger.info("✅ Contadores diarios reconciliados")
+
 def create_dashboard_summary():
     """Crear resumen para dashboard"""
     try:
-        from cassandra.cluster import Cluster
-        
-        cluster = Cluster(['cassandra'])
-        session = cluster.connect('ecommerce_analytics')
+        session = get_session()
         
         # Obtener estadísticas
         stats = {}
@@ -163,23 +244,17 @@ def create_dashboard_summary():
         result = session.execute("SELECT COUNT(*) FROM inventory_current")
         stats['total_products'] = result.one()[0]
         
-        # Total proveedores
-        result = session.execute("SELECT COUNT(*) FROM suppliers WHERE active = true ALLOW FILTERING")
-        stats['active_suppliers'] = result.one()[0]
+        # Total proveedores (tabla pequeña: se filtra en cliente en lugar de ALLOW FILTERING)
+        result = session.execute("SELECT active FROM suppliers")
+        stats['active_suppliers'] = sum(1 for row in result if row.active)
+        
+        today = datetime.now().date()
         
         # Recomendaciones de hoy
-        result = session.execute(
-            "SELECT COUNT(*) FROM inventory_recommendations WHERE recommendation_date = ? ALLOW FILTERING",
-            [datetime.now().date()]
-        )
-        stats['todays_recommendations'] = result.one()[0]
+        stats['todays_recommendations'] = get_daily_count(session, 'recommendations', today)
         
         # Eventos recientes
-        result = session.execute(
-            "SELECT COUNT(*) FROM inventory_events WHERE event_timestamp >= ? ALLOW FILTERING",
-            [datetime.now().replace(hour=0, minute=0, second=0)]
-        )
-        stats['todays_events'] = result.one()[0]
+        stats['todays_events'] = get_daily_count(session, 'inventory_events', today)
         
         logger.info("📊 RESUMEN DEL SISTEMA RL:")
         logger.info(f"   📦 Productos en inventario: {stats['total_products']}")
@@ -187,14 +262,30 @@ def create_dashboard_summary():
         logger.info(f"   💡 Recomendaciones hoy: {stats['todays_recommendations']}")
         logger.info(f"   📝 Eventos hoy: {stats['todays_events']}")
         
-        cluster.shutdown()
         return stats
         
     except Exception as e:
         logger.error(f"❌ Error creando resumen: {e}")
         return {}
 
-def main():
+async def run_rl_steps(loop):
+    """Pasos 2-3: entrenamiento y recomendaciones en el executor (el driver de Cassandra es bloqueante)"""
+    success_count = 0
+    
+    # 2. Ejecutar entrenamiento RL
+    logger.info("\n2️⃣ Ejecutando entrenamiento del agente RL...")
+    if await loop.run_in_executor(None, run_rl_training):
+        success_count += 1
+    
+    # 3. Generar recomendaciones
+    logger.info("\n3️⃣ Generando recomendaciones...")
+    recommendations = await loop.run_in_executor(None, generate_recommendations)
+    if recommendations:
+        success_count += 1
+    
+    return success_count
+
+async def main():
     """Función principal"""
     logger.info("🚀 INICIANDO SISTEMA COMPLETO DE RL PARA INVENTARIOS")
     logger.info("="*60)
@@ -202,7 +293,7 @@ def main():
     success_count = 0
     total_steps = 6
     
-    # 1. Verificar conexión a Cassandra
+    # 1. Verificar conexión a Cassandra (precondición del resto de pasos)
     logger.info("1️⃣ Verificando conexión a Cassandra...")
     if test_cassandra_connection():
         success_count += 1
@@ -210,31 +301,29 @@ def main():
         logger.error("💥 Sistema abortado - no hay conexión a Cassandra")
         return False
     
-    # 2. Ejecutar entrenamiento RL
-    logger.info("\n2️⃣ Ejecutando entrenamiento del agente RL...")
-    if run_rl_training():
-        success_count += 1
-    
-    # 3. Generar recomendaciones
-    logger.info("\n3️⃣ Generando recomendaciones...")
-    recommendations = generate_recommendations()
-    if recommendations:
-        success_count += 1
+    # Migración de contadores diarios, antes de que los pasos RL los incrementen
+    try:
+        backfill_daily_counters(get_session())
+    except Exception as e:
+        logger.warning(f"⚠️ Error reconciliando contadores diarios: {e}")
     
-    # 4. Iniciar servidor API
+    # El arranque del API (4) no depende de los pasos RL (2-3): se ejecutan en paralelo
+    loop = asyncio.get_running_loop()
     logger.info("\n4️⃣ Iniciando servidor API...")
-    api_process = start_api_server()
+    rl_count, api_process = await asyncio.gather(run_rl_steps(loop), start_api_server())
+    success_count += rl_count
     if api_process:
         success_count += 1
     
-    # 5. Probar endpoints
+    # 5-6. Con las recomendaciones guardadas y el API listo: probar endpoints y
+    # crear el resumen en paralelo (el driver de Cassandra es bloqueante: executor)
     logger.info("\n5️⃣ Probando endpoints del API...")
-    if test_api_endpoints():
-        success_count += 1
-    
-    # 6. Crear resumen
     logger.info("\n6️⃣ Creando resumen del sistema...")
-    stats = create_dashboard_summary()
+    stats_task = loop.run_in_executor(None, create_dashboard_summary)
+    probe_task = test_api_endpoints()
+    stats, api_ok = await asyncio.gather(stats_task, probe_task)
+    if api_ok:
+        success_count += 1
     if stats:
         success_count += 1
     
@@ -258,23 +347,26 @@ def main():
             logger.info("\n🔄 Manteniendo servidor API activo...")
             logger.info("💡 Presiona Ctrl+C para detener")
             try:
-                api_process.wait()
-            except KeyboardInterrupt:
+                await api_process.wait()
+            except asyncio.CancelledError:
+                # Ctrl+C cancela la tarea principal del event loop
                 logger.info("\n🛑 Deteniendo servidor...")
                 api_process.terminate()
-                api_process.wait()
+                await api_process.wait()
                 logger.info("✅ Servidor detenido")
+                raise
     else:
         logger.warning(f"⚠️ Sistema parcialmente funcional ({success_count}/{total_steps})")
         if api_process:
             api_process.terminate()
+            await api_process.wait()
     
     return success_count == total_steps
 
 if __name__ == "__main__":
     try:
-        main()
-    except KeyboardInterrupt:
+        asyncio.run(main())
+    except (KeyboardInterrupt, asyncio.CancelledError):
         logger.info("\n🛑 Sistema interrumpido por el usuario")
     except Exception as e:
         logger.error(f"💥 Error crítico: {e}")
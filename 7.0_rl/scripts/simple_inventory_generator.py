@@ -4,26 +4,64 @@ Script simplificado para generar datos de inventario para RL
 """
 import pandas as pd
 import numpy as np
-import random
-from datetime import datetime, timedelta
+from datetime import datetime
 from cassandra.cluster import Cluster
+from cassandra.query import BatchStatement, BatchType
 import uuid
+import os
+import sys
 import logging
+from collections import deque
+from retail_data import read_retail_data
+
+# prepare_cached vive en src/ (desplegado junto a scripts/ en /opt/rl)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from cassandra_utils import prepare_cached
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Máximo de INSERT asíncronos en vuelo hacia Cassandra
+MAX_IN_FLIGHT = 128
+
+# Dataset de retail y su caché Parquet (solo las columnas que usa el generador)
+EXCEL_PATH = '/tmp/online_retail.xlsx'
+PARQUET_PATH = '/tmp/online_retail.parquet'
+RETAIL_COLUMNS = ['StockCode', 'Quantity', 'UnitPrice', 'Description']
+
+def log_insert_error(exc):
+    """Registrar un INSERT asíncrono fallido sin detener la carga"""
+    logger.warning(f"⚠️ Error en INSERT asíncrono: {exc}")
+
+def wait_insert(future):
+    """Esperar un INSERT asíncrono; los fallos ya quedaron registrados por su errback"""
+    try:
+        future.result()
+    except Exception:
+        pass
+
 def main():
     try:
         logger.info("🚀 Iniciando generación simple de datos de inventario...")
         
         # Conectar a Cassandra
-        cluster = Cluster(['cassandra'])
+        cluster = Cluster(['cassandra'], protocol_version=4)
         session = cluster.connect('ecommerce_analytics')
+        session.default_timeout = 30
+        
+        # Ventana acotada de INSERT asíncronos en vuelo
+        in_flight = deque()
+        
+        def submit(statement, params):
+            future = session.execute_async(statement, params)
+            future.add_errback(log_insert_error)
+            in_flight.append(future)
+            if len(in_flight) >= MAX_IN_FLIGHT:
+                wait_insert(in_flight.popleft())
         
         # Cargar Excel
         logger.info("📊 Cargando datos del Excel...")
-        df = pd.read_excel('/tmp/online_retail.xlsx')
+        df = read_retail_data(EXCEL_PATH, PARQUET_PATH, columns=RETAIL_COLUMNS, engine='calamine')
         logger.info(f"✅ Cargados {len(df)} registros")
         
         # Limpiar y procesar datos
@@ -42,6 +80,51 @@ def main():
         
         logger.info(f"✅ Procesando {len(top_products)} productos top")
         
+        # Calcular los campos de todos los productos con operaciones por columna,
+        # usando una sola muestra aleatoria por campo
+        rng = np.random.default_rng()
+        n = len(top_products)
+        rank = np.arange(n)
+        quantity = top_products['Quantity'].to_numpy()
+        unit_price = top_products['UnitPrice'].to_numpy()
+        now = datetime.now()
+        
+        # Stock basado en demanda (estimación de demanda diaria, 20-60 días de stock)
+        daily_demand = np.maximum(1, quantity // 365).astype(np.int64)
+        current_stock = daily_demand * rng.integers(20, 61, n)
+        
+        # Costos basados en precio
+        procurement_cost = unit_price * rng.uniform(0.5, 0.8, n)
+        
+        inventory_rows = pd.DataFrame({
+            'stock_code': top_products.index.astype(str),
+            'current_stock': current_stock,
+            'max_stock_capacity': (current_stock * rng.uniform(1.5, 2.5, n)).astype(np.int64),
+            'reorder_point': daily_demand * rng.integers(10, 21, n),
+            'safety_stock': daily_demand * rng.integers(5, 16, n),
+            'location_id': 'WH001-A-' + pd.Series(rank + 1).astype(str).str.zfill(2),
+            'storage_cost_per_unit': np.round(procurement_cost * 0.02, 2),
+            'last_restock_date': now - pd.to_timedelta(rng.integers(1, 31, n), unit='D'),
+            'last_updated': now,
+            'updated_by': 'generator'
+        })
+        
+        cost_rows = pd.DataFrame({
+            'stock_code': inventory_rows['stock_code'],
+            'procurement_cost': np.round(procurement_cost, 2),
+            'holding_cost_rate': np.round(rng.uniform(0.10, 0.20, n), 2),
+            'stockout_penalty': np.round(unit_price * rng.uniform(0.1, 0.3, n), 2),
+            'ordering_cost': np.round(rng.uniform(50, 150, n), 2),
+            'waste_cost_rate': np.round(rng.uniform(0.02, 0.08, n), 3),
+            'insurance_cost_rate': np.round(rng.uniform(0.005, 0.02, n), 3),
+            'shelf_life_days': rng.integers(365, 1096, n),
+            'storage_requirements': rng.choice(['normal', 'climate_controlled', 'fragile'], n),
+            # Clasificación ABC simple por posición en el ranking de revenue
+            'abc_classification': np.select([rank < 15, rank < 35], ['A', 'B'], 'C'),
+            'profit_margin': np.round(rng.uniform(0.20, 0.50, n), 2),
+            'updated_at': now
+        })
+        
         # Insertar datos de inventario
         inventory_query = """
             INSERT INTO inventory_current (
@@ -59,57 +142,22 @@ def main():
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
         
+        ins_inv = prepare_cached(session, inventory_query)
+        ins_cost = prepare_cached(session, cost_query)
+        
+        # Un lote UNLOGGED por producto (inventario + costos, misma clave stock_code) que se
+        # envía por la ventana asíncrona; agrupar productos distintos en un lote obligaría al
+        # coordinador a repartirlo entre muchas particiones
+        # itertuples(name=None) entrega escalares Python listos para enviar al driver
         count = 0
-        for stock_code, row in top_products.iterrows():
-            count += 1
-            
-            # Calcular stock basado en demanda
-            daily_demand = max(1, int(row['Quantity'] / 365))  # Estimación de demanda diaria
-            current_stock = daily_demand * random.randint(20, 60)  # 20-60 días de stock
-            max_capacity = int(current_stock * random.uniform(1.5, 2.5))
-            reorder_point = daily_demand * random.randint(10, 20)
-            safety_stock = daily_demand * random.randint(5, 15)
-            
-            # Costos basados en precio
-            procurement_cost = row['UnitPrice'] * random.uniform(0.5, 0.8)
-            
-            # Clasificación ABC simple
-            if count <= 15:
-                abc_class = 'A'
-            elif count <= 35:
-                abc_class = 'B'
-            else:
-                abc_class = 'C'
-            
-            # Insertar inventario
-            session.execute(inventory_query, [
-                str(stock_code),
-                current_stock,
-                max_capacity,
-                reorder_point,
-                safety_stock,
-                f"WH001-A-{count:02d}",
-                round(procurement_cost * 0.02, 2),
-                datetime.now() - timedelta(days=random.randint(1, 30)),
-                datetime.now(),
-                'generator'
-            ])
-            
-            # Insertar costos
-            session.execute(cost_query, [
-                str(stock_code),
-                round(procurement_cost, 2),
-                round(random.uniform(0.10, 0.20), 2),
-                round(row['UnitPrice'] * random.uniform(0.1, 0.3), 2),
-                round(random.uniform(50, 150), 2),
-                round(random.uniform(0.02, 0.08), 3),
-                round(random.uniform(0.005, 0.02), 3),
-                random.randint(365, 1095),
-                random.choice(['normal', 'climate_controlled', 'fragile']),
-                abc_class,
-                round(random.uniform(0.20, 0.50), 2),
-                datetime.now()
-            ])
+        for count, (inventory_row, cost_row) in enumerate(zip(
+            inventory_rows.itertuples(index=False, name=None),
+            cost_rows.itertuples(index=False, name=None)
+        ), start=1):
+            batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+            batch.add(ins_inv, inventory_row)
+            batch.add(ins_cost, cost_row)
+            submit(batch, None)
             
             if count % 10 == 0:
                 logger.info(f"✅ Procesados {count} productos...")
@@ -129,19 +177,29 @@ def main():
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
         
-        for supplier_id, name, reliability in suppliers:
-            session.execute(supplier_query, [
+        ins_sup = prepare_cached(session, supplier_query)
+        lead_times = rng.integers(5, 16, len(suppliers)).tolist()
+        lead_time_variances = rng.integers(1, 4, len(suppliers)).tolist()
+        min_order_quantities = rng.integers(50, 201, len(suppliers)).tolist()
+        for (supplier_id, name, reliability), lead_time, variance, min_qty in zip(
+            suppliers, lead_times, lead_time_variances, min_order_quantities
+        ):
+            submit(ins_sup, [
                 supplier_id,
                 name,
                 reliability,
-                random.randint(5, 15),
-                random.randint(1, 3),
-                random.randint(50, 200),
+                lead_time,
+                variance,
+                min_qty,
                 'NET30',
                 True,
                 datetime.now()
             ])
         
+        # Esperar los INSERT pendientes de productos y proveedores
+        while in_flight:
+            wait_insert(in_flight.popleft())
+        
         # Insertar almacén
         logger.info("🏢 Configurando almacén...")
         warehouse_query = """
@@ -152,7 +210,8 @@ def main():
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
         
-        session.execute(warehouse_query, [
+        ins_wh = prepare_cached(session, warehouse_query)
+        session.execute(ins_wh, [
             'WH001',
             'Central Warehouse',
             'London, UK',
@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+"""
+Utilidades de Cassandra compartidas por los generadores de datos de inventario
+"""
+
+# Sentencias preparadas por texto CQL, reutilizadas entre invocaciones
+_PREPARED_STATEMENTS = {}
+
+def prepare_cached(session, cql):
+    """Preparar una sentencia CQL una sola vez y reutilizarla en llamadas posteriores"""
+    statement = _PREPARED_STATEMENTS.get(cql)
+    if statement is None:
+        statement = _PREPARED_STATEMENTS[cql] = session.prepare(cql)
+    return statement
@@ -8,14 +8,23 @@ import time
 from cassandra.cluster import Cluster
 from cassandra.auth import PlainTextAuthProvider
 
+# Espera inicial entre reintentos (segundos); se duplica en cada fallo hasta RETRY_MAX_DELAY
+RETRY_INITIAL_DELAY = 0.25
+RETRY_MAX_DELAY = 16.0
+# Tiempo máximo total de espera por servicio antes de abortar (segundos)
+RETRY_DEADLINE = 120.0
+# Timeout de conexión por intento (segundos)
+CONNECT_TIMEOUT = 2
+
 def check_cassandra_connection():
     """Verifica la conexión con Cassandra"""
     cassandra_host = os.getenv('CASSANDRA_HOST', 'cassandra')
     cassandra_port = int(os.getenv('CASSANDRA_PORT', 9042))
     
+    cluster = Cluster([cassandra_host], port=cassandra_port,
+                      connect_timeout=CONNECT_TIMEOUT,
+                      control_connection_timeout=CONNECT_TIMEOUT)
     try:
-        # Crear cluster
-        cluster = Cluster([cassandra_host], port=cassandra_port)
         session = cluster.connect()
         
         # Ejecutar consulta simple
@@ -23,13 +32,13 @@ def check_cassandra_connection():
         version = result.one()[0]
         
         print(f"✅ Cassandra está disponible - Versión: {version}")
-        session.shutdown()
-        cluster.shutdown()
         return True
         
     except Exception as e:
         print(f"❌ Error conectando a Cassandra: {e}")
         return False
+    finally:
+        cluster.shutdown()
 
 def check_redis_connection():
     """Verifica la conexión con Redis"""
@@ -39,7 +48,8 @@ def check_redis_connection():
     redis_port = int(os.getenv('REDIS_PORT', 6379))
     
     try:
-        r = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
+        r = redis.Redis(host=redis_host, port=redis_port, decode_responses=True,
+                        socket_connect_timeout=CONNECT_TIMEOUT)
         r.ping()
         print("✅ Redis está disponible")
         return True
@@ -48,22 +58,28 @@ def check_redis_connection():
         print(f"❌ Error conectando a Redis: {e}")
         return False
 
+def wait_for_service(check, name):
+    """Reintenta check con backoff exponencial hasta que responda o se agote RETRY_DEADLINE"""
+    deadline = time.monotonic() + RETRY_DEADLINE
+    delay = RETRY_INITIAL_DELAY
+    while not check():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            print(f"❌ {name} no disponible tras {RETRY_DEADLINE:.0f}s")
+            return False
+        print(f"⏳ Esperando que {name} esté disponible (reintento en {delay:.2f}s)...")
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, RETRY_MAX_DELAY)
+    return True
+
 if __name__ == "__main__":
     # Verificar Cassandra
-    cassandra_ready = False
-    while not cassandra_ready:
-        cassandra_ready = check_cassandra_connection()
-        if not cassandra_ready:
-            print("⏳ Esperando que Cassandra esté disponible...")
-            time.sleep(5)
+    if not wait_for_service(check_cassandra_connection, "Cassandra"):
+        sys.exit(1)
     
     # Verificar Redis
-    redis_ready = False
-    while not redis_ready:
-        redis_ready = check_redis_connection()
-        if not redis_ready:
-            print("⏳ Esperando que Redis esté disponible...")
-            time.sleep(5)
+    if not wait_for_service(check_redis_connection, "Redis"):
+        sys.exit(1)
     
     print("✅ Todos los servicios están disponibles")
-    sys.exit(0) 
\ No newline at end of file
+    sys.exit(0)
@@ -3,14 +3,23 @@
 Script simple para generar datos de inventario para RL
 """
 from cassandra.cluster import Cluster
+from cassandra.query import BatchStatement, BatchType
 import random
 from datetime import datetime
 import logging
 import os
+from cassandra_utils import prepare_cached
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def execute_batch(session, batch):
+    """Ejecutar el BATCH de un producto registrando el fallo sin abortar la generación"""
+    try:
+        session.execute(batch)
+    except Exception as e:
+        logger.warning(f"❌ Error insertando lote de {len(batch)} sentencias: {e}")
+
 def generate_inventory_data():
     """Generar datos de inventario basándose en productos existentes"""
     logger.info("🚀 Generando datos de inventario para RL...")
@@ -56,7 +65,11 @@ def generate_inventory_data():
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """
         
-        # Generar datos para cada producto
+        ins_inv = prepare_cached(session, inventory_query)
+        ins_cost = prepare_cached(session, cost_query)
+        
+        # Generar datos para cada producto en un lote UNLOGGED propio: ambos INSERT comparten
+        # la clave stock_code, así el coordinador no reparte el lote entre varias particiones
         for i, stock_code in enumerate(products):
             try:
                 # Datos de inventario
@@ -65,7 +78,8 @@ def generate_inventory_data():
                 reorder_point = current_stock // 3
                 safety_stock = current_stock // 6
                 
-                session.execute(inventory_query, [
+                batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+                batch.add(ins_inv, [
                     stock_code, current_stock, max_capacity, reorder_point,
                     safety_stock, f"WH001-A-{i:02d}", 0.15, datetime.now(),
                     datetime.now(), 'rl_generator'
@@ -76,11 +90,13 @@ def generate_inventory_data():
                 procurement_cost = random.uniform(5.0, 50.0)
                 holding_rate = random.uniform(0.10, 0.25)
                 
-                session.execute(cost_query, [
+                batch.add(ins_cost, [
                     stock_code, procurement_cost, holding_rate, 150.0,
                     30.0, abc_class, random.uniform(0.20, 0.40), datetime.now()
                 ])
                 
+                execute_batch(session, batch)
+                
                 if (i + 1) % 10 == 0:
                     logger.info(f"📦 Procesados {i + 1}/{len(products)} productos")
                     
@@ -16,14 +16,30 @@ from inventory_rl_agent import InventoryQLearningAgent, InventoryState
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def ensure_daily_counters_table(session):
+    """Crear la tabla de contadores diarios si no existe (esquemas inicializados antes de añadirla)"""
+    session.execute("""
+        CREATE TABLE IF NOT EXISTS daily_counters (
+            metric text,
+            day date,
+            value counter,
+            PRIMARY KEY ((metric), day)
+        ) WITH CLUSTERING ORDER BY (day DESC)
+    """)
+
 class InventoryRLRunner:
-    def __init__(self):
+    def __init__(self, session=None):
         self.cassandra_host = os.getenv('CASSANDRA_HOST', 'cassandra')
         self.cassandra_port = int(os.getenv('CASSANDRA_PORT', 9042))
         
-        # Conectar a Cassandra
-        self.cluster = Cluster([self.cassandra_host], port=self.cassandra_port)
-        self.session = self.cluster.connect('ecommerce_analytics')
+        # Conectar a Cassandra (o reutilizar una sesión compartida, cuyo cluster no se cierra aquí)
+        if session is not None:
+            self.session = session
+        else:
+            self.cluster = Cluster([self.cassandra_host], port=self.cassandra_port)
+            self.session = self.cluster.connect('ecommerce_analytics')
+        
+        ensure_daily_counters_table(self.session)
         
         # Inicializar agente RL
         self.agent = InventoryQLearningAgent(
@@ -148,6 +164,20 @@ class InventoryRLRunner:
                 f"RL Agent action: {action_taken}",
                 'rl_agent'
             ])
+            self.increment_daily_counter('inventory_events', 1)
+    
+    def increment_daily_counter(self, metric, amount):
+        """Sumar al contador diario que lee el resumen del sistema"""
+        if not amount:
+            return
+        # El contador solo alimenta el resumen: un fallo no debe detener el entrenamiento
+        try:
+            self.session.execute(
+                "UPDATE daily_counters SET value = value + %s WHERE metric = %s AND day = %s",
+                [amount, metric, datetime.now().date()]
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo actualizar el contador diario {metric}: {e}")
     
     def calculate_reward(self, old_state, action, new_state, product):
         """Calcular recompensa basada en el estado del inventario"""
@@ -349,6 +379,19 @@ class InventoryRLRunner:
         
         today = datetime.now().date()
         
+        # Solo las claves (stock_code, día) nuevas suman al contador diario:
+        # volver a guardar las recomendaciones del mismo día sobrescribe filas
+        stock_codes = {rec['stock_code'] for rec in recommendations}
+        existing = set()
+        if stock_codes:
+            existing = {
+                row.stock_code for row in self.session.execute(
+                    "SELECT stock_code FROM inventory_recommendations "
+                    "WHERE stock_code IN %s AND recommendation_date = %s",
+                    [tuple(stock_codes), today]
+                )
+            }
+        
         for rec in recommendations:
             self.session.execute(insert_query, [
                 rec['stock_code'],
@@ -362,6 +405,8 @@ class InventoryRLRunner:
                 datetime.now()
             ])
         
+        self.increment_daily_counter('recommendations', len(stock_codes - existing))
+        
         logger.info(f"✅ Guardadas {len(recommendations)} recomendaciones")
     
     def run(self):
@@ -371,6 +371,35 @@ def get_agent_state():
             "error": str(e)
         }), 500
 
+@app.route('/api/v1/rl/dashboard', methods=['GET'])
+def get_dashboard():
+    """Estado del agente y métricas en una sola respuesta para el dashboard.
+    Si una de las partes falla se devuelve como null y la otra se mantiene."""
+    try:
+        data = {}
+        for key, view in (("agent", get_agent_state), ("metrics", get_metrics)):
+            response, status = view()
+            data[key] = response.get_json()["data"] if status == 200 else None
+        
+        if not any(data.values()):
+            return jsonify({
+                "success": False,
+                "error": "Servicios no disponibles"
+            }), 503
+        
+        return jsonify({
+            "success": True,
+            "data": data,
+            "timestamp": datetime.now().isoformat()
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error en get_dashboard: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
 if __name__ == '__main__':
     # Inicializar conexiones
     init_connections()
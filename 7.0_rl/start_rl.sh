@@ -41,7 +41,7 @@ DASH_PID=$!
 
 # Iniciar dashboard de inventarios en background
 echo "📦 Iniciando dashboard de inventarios..."
-python inventory_dashboard.py &
+gunicorn -k gevent -w 2 --worker-connections 1000 -b 0.0.0.0:8051 inventory_dashboard:server &
 INV_DASH_PID=$!
 
 echo "✅ Componente RL de INVENTARIOS iniciado completamente"
@@ -82,7 +82,10 @@ setup_cassandra_tables() {
     docker exec ecommerce-cassandra cqlsh -e "CREATE KEYSPACE IF NOT EXISTS ecommerce_analytics WITH replication = {'class': 'SimpleStrategy', 'replication_factor': 1};" || true
     
     # Crear tablas principales
-    docker exec ecommerce-cassandra cqlsh -e "USE ecommerce_analytics; CREATE TABLE IF NOT EXISTS revenue_by_country_time (country text, date_bucket date, hour int, timestamp timestamp, invoice_no text, customer_id text, revenue_gbp decimal, revenue_usd decimal, order_count int, customer_count int, avg_order_value decimal, created_at timestamp, updated_at timestamp, PRIMARY KEY ((country, date_bucket), hour));" || true
+    docker exec ecommerce-cassandra cqlsh -e "USE ecommerce_analytics; CREATE TABLE IF NOT EXISTS revenue_by_country_time (country text, date_bucket date, hour int, timestamp timestamp, invoice_no text, customer_id text, revenue_gbp float, revenue_usd float, order_count int, customer_count int, avg_order_value float, PRIMARY KEY ((country, date_bucket), hour));" || true
+    
+    # Instalaciones previas: la hora de escritura se obtiene con writetime()
+    docker exec ecommerce-cassandra cqlsh -e "USE ecommerce_analytics; ALTER TABLE revenue_by_country_time DROP (created_at, updated_at);" 2>/dev/null || true
     
     docker exec ecommerce-cassandra cqlsh -e "USE ecommerce_analytics; CREATE TABLE IF NOT EXISTS transactions (invoice_no text, stock_code text, description text, quantity int, invoice_date timestamp, unit_price decimal, customer_id text, country text, total_amount decimal, created_at timestamp, PRIMARY KEY (invoice_no, stock_code));" || true
     